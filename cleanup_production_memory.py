@@ -7,58 +7,202 @@ Simple utility to remove test data contamination from production memory.
 Focuses on the main contamination patterns we identified.
 """
 
+import argparse
+import bisect
 import os
 import sys
 import json
+import re
 import shutil
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any
 
 # Add current directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Linux ioctl that asks the filesystem for a copy-on-write clone of a file
+FICLONE = 0x40049409
+
+# Sibling directory that old backups are renamed into before deletion
+BACKUP_TRASH_DIR = ".deleted"
+
+
+def clone_file(src: str, dst: str, reflink: bool = True):
+    """Copy a file, using a copy-on-write reflink when the filesystem supports it"""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            if fcntl is None or not reflink:
+                raise OSError("reflinks unsupported")
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            try:
+                # In-kernel copy, avoids bouncing bytes through userspace
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if not copied:
+                        break
+                    remaining -= copied
+            except (AttributeError, OSError):
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst)
+    shutil.copystat(src, dst)
+
+
+def backup_tree(src: Path, dst: Path):
+    """
+    Copy a directory tree, copying files in parallel with a thread pool.
+
+    Reflinks are only attempted when both trees live on the same filesystem,
+    where they turn the backup into a metadata-only operation. Hardlinks are
+    deliberately never used: Chroma rewrites its files in place, so a
+    hardlinked backup would change along with the live database.
+    """
+    dst.mkdir(parents=True, exist_ok=True)
+    reflink = os.stat(src).st_dev == os.stat(dst).st_dev
+
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = []
+        for root, dirs, files in os.walk(src):
+            target = dst / Path(root).relative_to(src)
+            target.mkdir(parents=True, exist_ok=True)
+            for name in files:
+                futures.append(
+                    pool.submit(
+                        clone_file, os.path.join(root, name), target / name, reflink
+                    )
+                )
+        for future in futures:
+            future.result()
+
+
+def purge_backup_trash(db_path: Path):
+    """Finish removing any backups left in the trash by an interrupted run"""
+    trash = db_path.parent / BACKUP_TRASH_DIR
+    if trash.exists():
+        shutil.rmtree(trash, ignore_errors=True)
+
 
 def cleanup_old_backups(db_path: Path, keep_count: int = 2):
     """Remove old backup directories, keeping only the most recent ones"""
-    backup_pattern = "closer_memory_db_backup_*"
-    backup_dirs = list(db_path.parent.glob(backup_pattern))
+    backup_prefix = "closer_memory_db_backup_"
+    backup_dirs = []
+    with os.scandir(db_path.parent) as entries:
+        for entry in entries:
+            if not entry.name.startswith(backup_prefix):
+                continue
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                timestamp = int(entry.name[len(backup_prefix) :])
+            except ValueError:
+                continue
+            backup_dirs.append((timestamp, entry))
 
     if len(backup_dirs) <= keep_count:
         return
 
     # Sort by timestamp (newest first)
-    backup_dirs.sort(key=lambda x: x.name.split("_")[-1], reverse=True)
+    backup_dirs.sort(key=lambda item: item[0], reverse=True)
 
-    # Remove old backups
-    for old_backup in backup_dirs[keep_count:]:
+    # Move old backups into the trash (a cheap rename) and delete them in the
+    # background so large Chroma trees don't stall the cleanup
+    trash = db_path.parent / BACKUP_TRASH_DIR
+    trash.mkdir(exist_ok=True)
+    for _, old_backup in backup_dirs[keep_count:]:
         print(f"  Removing old backup: {old_backup.name}")
-        shutil.rmtree(old_backup)
+        doomed = trash / f"{old_backup.name}.{os.getpid()}"
+        os.replace(old_backup.path, doomed)
+        threading.Thread(
+            target=shutil.rmtree, args=(doomed,), kwargs={"ignore_errors": True}
+        ).start()
+
+
+# Number of memories fetched per collection.get() call while scanning
+SCAN_PAGE_SIZE = 1000
+
+# Obvious test data patterns, compiled once into a single case-insensitive
+# alternation so each memory is scanned in one pass
+TEST_PATTERNS = (
+    "test memory",
+    "user loves diamonds",
+    "test data",
+    "testing memory",
+    "garbage data",
+    "test contamination",
+    "memory test",
+    "unit test",
+    "test case",
+)
+_TEST_PATTERN_RE = re.compile(
+    "|".join(re.escape(pattern) for pattern in TEST_PATTERNS), re.IGNORECASE
+)
 
 
 def is_test_contamination(text: str) -> bool:
     """
     Simple detection: identify obvious test data patterns
     """
-    test_patterns = [
-        "test memory",
-        "user loves diamonds",
-        "test data",
-        "testing memory",
-        "garbage data",
-        "test contamination",
-        "memory test",
-        "unit test",
-        "test case",
-    ]
-
-    text_lower = text.lower()
-    return any(pattern in text_lower for pattern in test_patterns)
-
-
-def main():
+    return _TEST_PATTERN_RE.search(text) is not None
+
+
+def find_contaminated(texts: List[str]) -> List[int]:
+    """
+    Return the positions of contaminated texts in a batch.
+
+    The batch is joined into one string and scanned with a single regex pass,
+    so the matching loop runs inside the regex engine instead of once per row
+    in Python. NUL separators keep matches from spanning two texts.
+    """
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text) + 1
+
+    hits = []
+    for match in _TEST_PATTERN_RE.finditer("\0".join(texts)):
+        row = bisect.bisect_right(starts, match.start()) - 1
+        if not hits or hits[-1] != row:
+            hits.append(row)
+    return hits
+
+
+def iter_memory_pages(collection, page_size: int = SCAN_PAGE_SIZE):
+    """Yield (ids, metadatas) pages from the collection without fetching embeddings"""
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page["ids"], page["metadatas"]
+        offset += len(page["ids"])
+
+
+def create_backup(db_path: Path) -> Path:
+    """Snapshot the database directory into a timestamped sibling backup"""
+    backup_path = db_path.parent / f"closer_memory_db_backup_{int(time.time())}"
+    backup_tree(db_path, backup_path)
+    return backup_path
+
+
+def main(assume_yes: bool = False):
     """
     5-Step Cleanup Process
+
+    The backup (step 3) is only made when the scan finds something to remove.
+    It runs in the background while the deletion is being confirmed.
     """
     print("🧹 Phase 3: Production Memory Cleanup")
     print("=" * 50)
@@ -70,55 +214,83 @@ def main():
 
         memory = create_production_memory_store()
         print(f"✓ Connected to: {memory.db_path}")
+
+        # Finish deleting backups from any previously interrupted run
+        purge_backup_trash(memory.db_path)
     except Exception as e:
         print(f"✗ Failed to connect: {e}")
         return False
 
     # Step 2: Identify contamination
     print("\n2. Scanning for contamination...")
-    contaminated = []
+    # Only ids are kept for every match; text excerpts are kept for the
+    # few examples that get displayed
+    ids_to_delete = []
+    idxs_to_delete = []
+    examples = []
 
     # Get all memories from the collection
     try:
         collection = memory.col
-        # Get everything from the collection
-        all_data = collection.get()
-
-        if not all_data["metadatas"]:
+        scanned = 0
+
+        # Scan through all memories page by page and identify contaminated ones.
+        # This can't be pushed down to a Chroma where_document filter: memory
+        # text lives in metadata rather than as a document, and $contains is
+        # case-sensitive while the patterns must match case-insensitively.
+        for ids, metadatas in iter_memory_pages(collection):
+            scanned += len(ids)
+            texts = [metadata.get("text", "") for metadata in metadatas]
+            for i in find_contaminated(texts):
+                ids_to_delete.append(ids[i])  # Use ChromaDB's internal ID
+                idxs_to_delete.append(metadatas[i].get("idx"))
+                if len(examples) < 5:
+                    text = texts[i]
+                    examples.append(text[:100] + "..." if len(text) > 100 else text)
+
+        if not scanned:
             print("✓ No memories found in database")
             return True
 
-        # Scan through all memories and identify contaminated ones
-        for i, metadata in enumerate(all_data["metadatas"]):
-            text = metadata.get("text", "")
-            if is_test_contamination(text):
-                contaminated.append(
-                    {
-                        "chroma_id": all_data["ids"][i],  # Use ChromaDB's internal ID
-                        "idx": metadata.get("idx"),
-                        "text": text[:100] + "..." if len(text) > 100 else text,
-                    }
-                )
-
-        print(f"✓ Found {len(contaminated)} contaminated memories")
+        print(f"✓ Found {len(ids_to_delete)} contaminated memories")
 
         # Show examples
-        if contaminated:
+        if examples:
             print("\nContamination examples:")
-            for i, item in enumerate(contaminated[:5]):
-                print(f"  {i+1}. {item['text']}")
+            for i, text in enumerate(examples):
+                print(f"  {i+1}. {text}")
 
     except Exception as e:
         print(f"✗ Error scanning database: {e}")
         return False
 
-    # Step 3: Backup database
+    # Step 3: Backup database, only needed if something will be removed
+    if not ids_to_delete:
+        print("\n3. ✓ No contamination to remove")
+        return True
+
     print("\n3. Creating backup...")
+    # The copy runs in the background while the deletion is confirmed
+    backup_executor = ThreadPoolExecutor(max_workers=1)
+    backup_future = backup_executor.submit(create_backup, memory.db_path)
+    backup_executor.shutdown(wait=False)
+
+    # Step 4: Remove contamination
+    print(f"\n4. Removing {len(ids_to_delete)} contaminated memories...")
+
+    # Confirm before deletion
+    if not assume_yes:
+        if not sys.stdin.isatty():
+            print("✗ Cleanup cancelled: no terminal to confirm on (pass --yes)")
+            return False
+        confirm = input(f"Remove {len(ids_to_delete)} contaminated memories? (y/N): ")
+        if confirm.lower() != "y":
+            print("✗ Cleanup cancelled")
+            return False
+
+    # Nothing is deleted until the backup is complete
     try:
-        backup_path = (
-            memory.db_path.parent / f"closer_memory_db_backup_{int(time.time())}"
-        )
-        shutil.copytree(memory.db_path, backup_path)
+        backup_path = backup_future.result()
         print(f"✓ Backup created: {backup_path}")
 
         # Clean up old backups
@@ -128,43 +300,27 @@ def main():
         print(f"✗ Backup failed: {e}")
         return False
 
-    # Step 4: Remove contamination
-    if not contaminated:
-        print("\n4. ✓ No contamination to remove")
-        return True
-
-    print(f"\n4. Removing {len(contaminated)} contaminated memories...")
-
-    # Confirm before deletion
-    confirm = input(f"Remove {len(contaminated)} contaminated memories? (y/N): ")
-    if confirm.lower() != "y":
-        print("✗ Cleanup cancelled")
-        return False
-
     try:
-        removed_count = 0
-        for item in contaminated:
-            chroma_id = item["chroma_id"]
-            idx = item["idx"]
-            print(f"  Removing memory (chroma_id: {chroma_id}, idx: {idx})")
-
-            if chroma_id:
-                # Remove from ChromaDB
-                memory.col.delete(ids=[chroma_id])
-                # Remove from index if it exists
-                if idx in memory.id_map:
-                    del memory.id_map[idx]
-                removed_count += 1
-                print(f"    ✓ Removed memory (chroma_id: {chroma_id})")
-            else:
-                print(f"    ✗ Memory (chroma_id: {chroma_id}) not found")
+        # Remove from ChromaDB in a single batched delete
+        count_before = memory.col.count()
+        memory.col.delete(ids=ids_to_delete)
+
+        # Remove from index if it exists
+        for idx in idxs_to_delete:
+            memory.id_map.pop(idx, None)
 
         # Save updated index
         memory._save_index()
-        print(f"✓ Removed {removed_count} contaminated memories")
+        print(f"✓ Removed {len(ids_to_delete)} contaminated memories")
 
-        # Add a small delay to ensure ChromaDB processes the deletions
-        time.sleep(1)
+        # Chroma deletes are synchronous; confirm the collection reflects them
+        # instead of sleeping and hoping
+        count_after = memory.refresh_count()
+        if count_after != count_before - len(ids_to_delete):
+            print(
+                f"⚠ Collection count is {count_after}, "
+                f"expected {count_before - len(ids_to_delete)}"
+            )
 
     except Exception as e:
         print(f"✗ Cleanup failed: {e}")
@@ -176,30 +332,22 @@ def main():
     # Step 5: Verify cleanup
     print("\n5. Verifying cleanup...")
     try:
-        # Re-scan for contamination
-        remaining_data = collection.get(include=["metadatas"])
-        remaining_contamination = 0
-        remaining_items = []
-
-        if remaining_data["metadatas"]:
-            for metadata in remaining_data["metadatas"]:
-                text = metadata.get("text", "")
-                if is_test_contamination(text):
-                    remaining_contamination += 1
-                    remaining_items.append(
-                        {
-                            "idx": metadata.get("idx"),
-                            "text": text[:100] + "..." if len(text) > 100 else text,
-                        }
-                    )
+        # Only the memories we just deleted need checking, so look them up by
+        # id instead of re-scanning the whole collection
+        still_present = collection.get(ids=ids_to_delete, include=["metadatas"])
+        remaining_contamination = len(still_present["ids"])
+        remaining_examples = []
+        for metadata in still_present["metadatas"][:5]:
+            text = metadata.get("text", "")
+            remaining_examples.append(text[:100] + "..." if len(text) > 100 else text)
 
         print(f"✓ Remaining contamination: {remaining_contamination}")
 
         # Show remaining contaminated memories
-        if remaining_items:
+        if remaining_examples:
             print("\nRemaining contaminated memories:")
-            for i, item in enumerate(remaining_items):
-                print(f"  {i+1}. {item['text']}")
+            for i, text in enumerate(remaining_examples):
+                print(f"  {i+1}. {text}")
 
         if remaining_contamination == 0:
             print("✓ Production database is clean!")
@@ -214,7 +362,15 @@ def main():
 
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--yes",
+        action="store_true",
+        help="remove contaminated memories without asking for confirmation",
+    )
+    args = parser.parse_args()
+
+    success = main(assume_yes=args.yes)
 
     if success:
         print("\n🎉 Cleanup completed successfully!")
@@ -13,172 +13,46 @@ The flow works like this:
 6. The cycle continues, building up conversation context
 """
 
-import asyncio, json, os, sys
+import asyncio, sys
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List
 
-from dotenv import load_dotenv
-from openai import OpenAI
 from rich import print
-from rich.console import Console
 
 # MCP SDK - Model Context Protocol for tool communication
 from mcp.client.stdio import stdio_client
 from mcp import ClientSession, StdioServerParameters  # ← ToolDescriptor removed
 
-# Load environment variables from .env file in the same directory
-# This brings in your API keys and configuration without hardcoding them
-load_dotenv()
+# OpenAI connection and helpers shared with the hybrid clients
+from client_common import (
+    OA_BASE_URL,
+    OA_KEY,
+    STREAM,
+    StreamedReply,
+    collect_stream,
+    extract_tool_text,
+    mcp_tool_to_openai,
+    oa_client,
+    parse_tool_args,
+    prompt_cache_params,
+    read_user_input,
+    reject_tool_call,
+    schedule_trim,
+    tool_calls_of,
+    tool_params,
+)
 
 MODEL = "gpt-4.1"
-# Rich console for beautiful terminal output with colors and formatting
-console = Console()
 
-# ──────────────────────────────────────
-# OpenAI Configuration
-# ──────────────────────────────────────
-# This section sets up the connection to either OpenAI's API or a local LLM server.
-# The flexibility here is powerful - you can run this with GPT-4, or switch to a
-# local model running on llama.cpp or similar just by changing environment variables.
-
-# If OPENAI_BASE_URL is set, we'll use that instead of the default OpenAI endpoint
-# This allows connecting to local LLM servers that implement the OpenAI API format
-OA_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. http://127.0.0.1:8000/v1
-
-# API key for authentication - defaults to "local-key" for local servers that don't need auth
-OA_KEY = os.getenv("OPENAI_API_KEY", "local-key")
-
-# Streaming mode shows responses as they're generated rather than waiting for completion
-# This provides a more interactive feel but requires more complex response handling
-STREAM = os.getenv("STREAM", "").lower() == "true"
-
-# Create the OpenAI client that we'll use for all LLM interactions
-# If base_url is None, it uses the default OpenAI API endpoint
-oa_client = OpenAI(api_key=OA_KEY, base_url=OA_BASE_URL if OA_BASE_URL else None)
-
-# ──────────────────────────────────────
-# Helper Functions
-# ──────────────────────────────────────
-# These utilities handle the translation between different formats and protocols
-
-
-def mcp_tool_to_openai(tool) -> Dict[str, Any]:  # no type-hint needed
-    """
-    Convert an MCP tool definition to OpenAI's function calling format.
-
-    MCP tools come from our server with their own structure, but OpenAI expects
-    functions to be formatted in a specific way. This bridges that gap.
-
-    The tool's inputSchema might be a dict or an object with __dict__, so we
-    handle both cases to extract the parameter schema.
-    """
-    # Extract the schema, handling both dict and object representations
-    schema = (
-        tool.inputSchema.__dict__
-        if hasattr(tool.inputSchema, "__dict__")
-        else tool.inputSchema
-    )
-
-    # Transform to OpenAI's expected format
-    return {
-        "type": "function",
-        "function": {
-            "name": tool.name,
-            "description": tool.description or "",
-            "parameters": schema,
-        },
-    }
-
-
-def tool_calls_of(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """
-    Extract tool calls from an OpenAI message response.
-
-    When the LLM decides to use tools, it includes them in a 'tool_calls' field.
-    This helper safely extracts that field, returning None if no tools were called.
-    """
-    return msg.get("tool_calls")
-
-
-def extract_tool_text(jawbone) -> str:
-    """
-    Extract the actual text content from an MCP tool response.
-
-    MCP responses come wrapped in a complex structure (nicknamed 'jawbone' here).
-    This function digs through various possible structures to find the actual
-    text response, handling different formats gracefully.
-
-    The response might be:
-    - A simple string
-    - An object with a 'text' attribute
-    - A dict with a 'text' key
-    - Nested inside a 'content' array
-    """
-    if not jawbone or not jawbone.content:
-        return ""
-
-    # Try different ways to extract text from the response structure
-    for part in jawbone.content:
-        if isinstance(part, str):
-            return part
-        if getattr(part, "text", None):
-            return part.text
-        if isinstance(part, dict) and "text" in part:
-            return part["text"]
-    return ""
-
-
-async def run_chat_client():
-    """
-    Main chat client function that orchestrates the entire conversation flow.
-
-    This function:
-    1. Starts the MCP server as a subprocess
-    2. Establishes communication with it
-    3. Discovers available tools
-    4. Runs an interactive chat loop where the LLM can use those tools
-
-    The beauty of this design is that the client doesn't need to know what
-    tools exist or how they work - it discovers them dynamically from the server.
-    """
+# Prompt-cache routing key (see client_common.prompt_cache_params);
+# PROMPT_CACHE_KEY overrides it
+PROMPT_CACHE_PARAMS = prompt_cache_params("closer")
 
-    # Configure how to start the MCP server
-    # We're launching i2i_server.py as a subprocess and will communicate via stdio
-    server_params = StdioServerParameters(
-        command="python3",
-        args=[str(Path(__file__).with_name("server.py"))],  # Find server in same dir
-        env=None,
-    )
-
-    # Start the server and establish bidirectional communication
-    # The 'async with' ensures proper cleanup even if something goes wrong
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            # Initialize the MCP session - this is like a handshake
-            await session.initialize()
-
-            # Discover what tools the server provides
-            # This is dynamic - add new tools to the server and they appear here automatically
-            tool_list = (await session.list_tools()).tools
-            if not tool_list:
-                print("[red]❌  No tools exposed by server.[/red]")
-                return
-
-            # Convert discovered tools to OpenAI format so the LLM can use them
-            oa_tools = [mcp_tool_to_openai(t) for t in tool_list]
-
-            # Show the user what tools are available
-            print(
-                "[green]Connected. Tools:[/green]",
-                ", ".join(t["function"]["name"] for t in oa_tools),
-            )
+# Upper bound on MCP tool calls executed at once when the LLM requests several
+MAX_CONCURRENT_TOOL_CALLS = 8
 
-            # Initialize conversation history with the system prompt
-            # This list will grow with each exchange, maintaining full context
-            messages: List[Dict[str, Any]] = [
-                {
-                    "role": "system",
-                    "content": """
+# Closer's persona and tool rules, sent as the first message of every chat
+SYSTEM_PROMPT = """
 CLOSER   •   S Y S T E M   P R O M P T
 
 **RULE 0** – On *every* user turn, Closer must emit at least one silent
@@ -303,9 +177,60 @@ OUTPUT FORMAT (always):
 (optional additional tool calls…)  
 <free-form reply in 1-3 vivid sentences>  
 <ONE gentle question>
-""",
-                },
-            ]
+"""
+
+# Shared, never mutated - every conversation starts from this same message
+SYSTEM_MSG: Dict[str, Any] = {"role": "system", "content": SYSTEM_PROMPT}
+
+
+async def run_chat_client():
+    """
+    Main chat client function that orchestrates the entire conversation flow.
+
+    This function:
+    1. Starts the MCP server as a subprocess
+    2. Establishes communication with it
+    3. Discovers available tools
+    4. Runs an interactive chat loop where the LLM can use those tools
+
+    The beauty of this design is that the client doesn't need to know what
+    tools exist or how they work - it discovers them dynamically from the server.
+    """
+
+    # Configure how to start the MCP server
+    # We're launching i2i_server.py as a subprocess and will communicate via stdio
+    server_params = StdioServerParameters(
+        command="python3",
+        args=[str(Path(__file__).with_name("server.py"))],  # Find server in same dir
+        env=None,
+    )
+
+    # Start the server and establish bidirectional communication
+    # The 'async with' ensures proper cleanup even if something goes wrong
+    async with stdio_client(server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            # Initialize the MCP session - this is like a handshake
+            await session.initialize()
+
+            # Discover what tools the server provides
+            # This is dynamic - add new tools to the server and they appear here automatically
+            tool_list = (await session.list_tools()).tools
+            if not tool_list:
+                print("[red]❌  No tools exposed by server.[/red]")
+                return
+
+            # Convert discovered tools to OpenAI format so the LLM can use them
+            oa_tools = [mcp_tool_to_openai(t) for t in tool_list]
+
+            # Show the user what tools are available
+            print(
+                "[green]Connected. Tools:[/green]",
+                ", ".join(t["function"]["name"] for t in oa_tools),
+            )
+
+            # Initialize conversation history with the system prompt
+            # This list will grow with each exchange, maintaining full context
+            messages: List[Dict[str, Any]] = [SYSTEM_MSG]
 
             # ════════════════════════════════════
             # Main Conversation Loop
@@ -319,7 +244,7 @@ OUTPUT FORMAT (always):
 
             while True:
                 # Get user input with nice formatting
-                user_msg = console.input("[bold cyan]You:[/bold cyan] ")
+                user_msg = await read_user_input("[bold cyan]You:[/bold cyan] ")
 
                 # Check for exit commands
                 if user_msg.lower() in {"quit", "exit"}:
@@ -339,99 +264,114 @@ OUTPUT FORMAT (always):
                     # First, add the LLM's message (with tool requests) to history
                     messages.append(resp_msg)
 
-                    # Execute each tool call the LLM requested
-                    for call in resp_msg["tool_calls"]:
+                    # Execute the tool calls the LLM requested concurrently
+                    # Wall time becomes the slowest call rather than the sum
+                    sem = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+
+                    async def run_one(call):
                         # Extract the tool name and arguments
                         fn_name = call["function"]["name"]
-                        fn_args = json.loads(call["function"].get("arguments", "{}"))
+                        # Parsed once with orjson; MCP's call_tool needs a dict
+                        fn_args = parse_tool_args(call)
+                        if fn_args is None:
+                            print(f"[red]→ {fn_name}: malformed arguments[/red]")
+                            return await reject_tool_call()
 
                         # Show the user what tool is being called (in grey for subtlety)
                         print(f"[grey]→ calling {fn_name}{fn_args}[/grey]")
 
                         # Actually call the tool via MCP session
                         # This executes on the server and returns results
-                        jaw = await session.call_tool(fn_name, fn_args)
+                        async with sem:
+                            return await session.call_tool(fn_name, fn_args)
+
+                    # A failed call is answered with its error rather than
+                    # ending the turn with the tool calls unanswered
+                    jaws = await asyncio.gather(
+                        *(run_one(call) for call in resp_msg["tool_calls"]),
+                        return_exceptions=True,
+                    )
 
-                        # Add tool results to conversation history
-                        # The LLM needs to know what the tools returned
+                    # Add tool results to conversation history, in the original order
+                    # The LLM needs to know what the tools returned
+                    for call, jaw in zip(resp_msg["tool_calls"], jaws):
+                        if isinstance(jaw, Exception):
+                            fn_name = call["function"]["name"]
+                            tool_result = f"Tool {fn_name} failed: {jaw}"
+                        else:
+                            tool_result = extract_tool_text(jaw)
                         messages.append(
                             {
                                 "role": "tool",
                                 "tool_call_id": call["id"],
-                                "content": extract_tool_text(jaw),
+                                "content": tool_result,
                             }
                         )
 
                     # Now ask the LLM for a final response that incorporates tool results
                     # Note: we pass empty tools list here since we don't want more tool calls
-                    final_msg = await call_openai(messages, [], use_stream=STREAM)
+                    # When streaming, the reply is printed token by token as it arrives
+                    reply = StreamedReply() if STREAM else None
+                    try:
+                        final_msg = await call_openai(
+                            messages, [], use_stream=STREAM, on_delta=reply
+                        )
+                    finally:
+                        streamed = reply.close() if reply else False
                     messages.append(final_msg)
 
                     # Display the final response with nice formatting
-                    print(
-                        f"[bold magenta]Closer:[/bold magenta] {final_msg['content']}"
-                    )
+                    if not streamed:
+                        reply_text = final_msg["content"]
+                        print(f"[bold magenta]Closer:[/bold magenta] {reply_text}")
                 else:
                     # No tool calls - just a regular response
                     messages.append(resp_msg)
                     print(f"[bold magenta]Closer:[/bold magenta] {resp_msg['content']}")
 
+                # Keep the request size bounded as the conversation grows; the
+                # summary is written in the background so the next turn doesn't
+                # wait for it
+                schedule_trim(messages)
+
 
-async def call_openai(msgs, tools, use_stream=False) -> Dict[str, Any]:
+async def call_openai(
+    msgs, tools, use_stream=False, on_delta: Callable[[str], None] | None = None
+) -> Dict[str, Any]:
     """
     Call the OpenAI API (or compatible endpoint) with messages and available tools.
 
     This function handles both streaming and non-streaming responses:
     - Non-streaming: Wait for complete response, simpler to handle
-    - Streaming: Show response as it's generated, better UX but more complex
+    - Streaming: Show response as it's generated, better UX but more complex;
+      on_delta receives each text fragment as soon as it arrives
 
     The function returns a standardized message dict regardless of mode.
     """
 
     if use_stream:
         # Streaming mode - responses come in chunks that we need to assemble
-        stream = oa_client.chat.completions.create(
+        stream = await oa_client.chat.completions.create(
             model=MODEL,
+            **PROMPT_CACHE_PARAMS,
             temperature=0.9,
             max_tokens=500,
             messages=msgs,
-            tools=tools,
-            tool_choice="required",  # Let the model decide when to use tools
+            **tool_params(tools, "required"),  # Force a tool call when tools exist
             stream=True,
         )
 
-        # Initialize a structure to accumulate the streamed response
-        merged = {"role": "assistant", "content": "", "tool_calls": []}
-
-        # Process each chunk as it arrives
-        for chunk in stream:
-            delta = chunk.choices[0].delta
-
-            # Accumulate text content
-            merged["content"] += delta.content or ""
-
-            # Handle tool calls if present in this chunk
-            if delta.tool_calls:
-                # Tool calls might come across multiple chunks, so we extend the list
-                merged["tool_calls"].extend(
-                    tc.model_dump() if hasattr(tc, "model_dump") else tc
-                    for tc in delta.tool_calls
-                )
-
-        # Clean up - remove tool_calls key if no tools were actually called
-        if not merged["tool_calls"]:
-            merged.pop("tool_calls")
-
-        return merged
+        # Reassemble the chunks (text and tool-call fragments) into one message
+        return await collect_stream(stream, on_delta)
     else:
         # Non-streaming mode - wait for complete response
-        resp = oa_client.chat.completions.create(
+        resp = await oa_client.chat.completions.create(
             model=MODEL,
+            **PROMPT_CACHE_PARAMS,
             temperature=0.9,
             max_tokens=500,
             messages=msgs,
-            tools=tools,
-            tool_choice="auto",  # Let the model decide when to use tools
+            **tool_params(tools, "auto"),  # Let the model decide when to use tools
             stream=False,
         )
 
@@ -449,9 +389,17 @@ if __name__ == "__main__":
         print("Set OPENAI_API_KEY or OPENAI_BASE_URL")
         sys.exit(1)
 
+    # Use uvloop's libuv-based event loop when it's installed (not on Windows)
+    try:
+        import uvloop
+    except ImportError:
+        run = asyncio.run
+    else:
+        run = uvloop.run
+
     # Run the async client, handling Ctrl+C gracefully
     try:
-        asyncio.run(run_chat_client())
+        run(run_chat_client())
     except KeyboardInterrupt:
         # User pressed Ctrl+C - exit cleanly without error traceback
         pass
@@ -0,0 +1,362 @@
+# client_common.py
+"""
+Helpers shared by the chat clients (client.py, hybrid_client.py and
+dev_hybrid_client.py): the OpenAI connection, tool-call plumbing, history
+trimming, and terminal input and output.
+"""
+
+import asyncio, os, threading
+from typing import Callable, Dict, Any, List
+
+import httpx
+import orjson
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from rich.console import Console
+
+try:
+    import h2  # noqa: F401  - httpx only negotiates HTTP/2 when h2 is installed
+except ImportError:
+    h2 = None
+
+# Load environment variables before reading the configuration below
+load_dotenv()
+
+console = Console()
+
+# ────────────────────────────────────
+# OpenAI Configuration
+# ────────────────────────────────────
+# If OPENAI_BASE_URL is set, requests go to that OpenAI-compatible server
+# (e.g. a local model on llama.cpp) instead of OpenAI itself
+OA_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. http://127.0.0.1:8000/v1
+OA_KEY = os.getenv("OPENAI_API_KEY", "local-key")
+STREAM = os.getenv("STREAM", "").lower() == "true"
+
+# Conversation history window - once the transcript exceeds the character budget,
+# everything but the system prompt and the most recent messages is folded into a
+# short summary so each request stays roughly constant in size
+HISTORY_CHAR_BUDGET = int(os.getenv("HISTORY_CHAR_BUDGET", "24000"))
+HISTORY_KEEP_MESSAGES = 8
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4.1-mini")
+
+# One pooled HTTP client for every request: connections are kept alive
+# between turns so each request skips the TCP and TLS handshakes, and with h2
+# installed, concurrent requests (e.g. a background summary) share one
+# HTTP/2 connection
+http_client = httpx.AsyncClient(
+    http2=h2 is not None,
+    limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=300.0),
+)
+oa_client = AsyncOpenAI(
+    api_key=OA_KEY,
+    base_url=OA_BASE_URL if OA_BASE_URL else None,
+    http_client=http_client,
+)
+
+
+def prompt_cache_params(default_key: str) -> Dict[str, Any]:
+    """
+    Request arguments carrying a client's prompt-cache routing key.
+
+    OpenAI caches each request's shared prefix (system prompt and tools)
+    automatically; sending the same key on every call routes requests to
+    servers that already hold that prefix. PROMPT_CACHE_KEY overrides the
+    key. Only sent to OpenAI itself by default, since OpenAI-compatible
+    servers may reject the unknown field.
+    """
+    key = os.getenv("PROMPT_CACHE_KEY", "" if OA_BASE_URL else default_key)
+    return {"extra_body": {"prompt_cache_key": key}} if key else {}
+
+
+# ────────────────────────────────────
+# Tool Calls
+# ────────────────────────────────────
+# OpenAI-format tool definitions, keyed by MCP tool name; tools don't change
+# after list_tools(), so reconnects reuse the converted schemas
+_OA_TOOLS_CACHE: Dict[str, Dict[str, Any]] = {}
+
+
+def mcp_tool_to_openai(tool) -> Dict[str, Any]:
+    """
+    Convert an MCP tool definition to OpenAI's function calling format.
+
+    The tool's inputSchema might be a dict or an object, so both are handled
+    when extracting the parameter schema.
+    """
+    cached = _OA_TOOLS_CACHE.get(tool.name)
+    if cached is not None:
+        return cached
+    schema = (
+        tool.inputSchema
+        if isinstance(tool.inputSchema, dict)
+        else vars(tool.inputSchema)
+    )
+    converted = {
+        "type": "function",
+        "function": {
+            "name": tool.name,
+            "description": tool.description or "",
+            "parameters": schema,
+        },
+    }
+    _OA_TOOLS_CACHE[tool.name] = converted
+    return converted
+
+
+def tool_params(tools, tool_choice: str) -> Dict[str, Any]:
+    """
+    Build the tool-related arguments for a chat completion request.
+
+    When no tools are offered (e.g. the follow-up call after tool results come
+    back) the tools and tool_choice fields are omitted entirely rather than
+    sending an empty list, which the OpenAI API rejects.
+    """
+    if not tools:
+        return {}
+    return {"tools": tools, "tool_choice": tool_choice}
+
+
+def tool_calls_of(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Tool calls requested in an OpenAI message, or None if there are none."""
+    return msg.get("tool_calls")
+
+
+def merge_tool_call_deltas(deltas) -> List[Dict[str, Any]]:
+    """
+    Reassemble streamed tool-call fragments into complete tool calls.
+
+    When streaming, OpenAI sends each tool call in pieces: the first fragment
+    carries the id and function name, and later fragments carry slices of the
+    JSON arguments. Fragments belonging to the same call share an `index`.
+    """
+    calls: Dict[int, Dict[str, Any]] = {}
+    argument_parts: Dict[int, List[str]] = {}
+
+    for tc in deltas:
+        call = calls.get(tc.index)
+        if call is None:
+            call = calls[tc.index] = {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""},
+            }
+            argument_parts[tc.index] = []
+
+        if tc.id:
+            call["id"] = tc.id
+        if tc.function:
+            if tc.function.name:
+                call["function"]["name"] = tc.function.name
+            if tc.function.arguments:
+                argument_parts[tc.index].append(tc.function.arguments)
+
+    for index, call in calls.items():
+        call["function"]["arguments"] = "".join(argument_parts[index])
+
+    return [calls[index] for index in sorted(calls)]
+
+
+async def collect_stream(
+    stream, on_delta: Callable[[str], None] | None = None
+) -> Dict[str, Any]:
+    """
+    Assemble a streamed completion into the message dict a non-streamed one
+    would return; on_delta receives each text fragment as soon as it arrives.
+    """
+    # Accumulate text fragments in a list and join once at the end,
+    # avoiding a new string allocation for every streamed token
+    content_parts: List[str] = []
+    tool_call_deltas = []
+
+    async for chunk in stream:
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            if on_delta:
+                on_delta(delta.content)
+        # Tool calls arrive as fragments spread across multiple chunks
+        if delta.tool_calls:
+            tool_call_deltas.extend(delta.tool_calls)
+
+    merged = {"role": "assistant", "content": "".join(content_parts)}
+    # Only include tool_calls if tools were actually called
+    if tool_call_deltas:
+        merged["tool_calls"] = merge_tool_call_deltas(tool_call_deltas)
+    return merged
+
+
+def parse_tool_args(call: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    Parse the JSON arguments of a tool call requested by the LLM.
+
+    Every tool takes an object of named parameters, so anything that isn't
+    valid JSON for an object returns None rather than raising. The server
+    checks the parameters themselves against the tool's schema.
+    """
+    try:
+        args = orjson.loads(call["function"].get("arguments") or "{}")
+    except orjson.JSONDecodeError:
+        return None
+    return args if isinstance(args, dict) else None
+
+
+async def reject_tool_call() -> None:
+    """
+    Stand-in for a tool call whose arguments couldn't be parsed.
+
+    Raising makes it fail like any other tool call, so the LLM is answered
+    with the error and can retry.
+    """
+    raise ValueError("arguments were not a valid JSON object")
+
+
+def extract_tool_text(jawbone) -> str:
+    """
+    Extract the text content from an MCP tool response.
+
+    Tools that return a list answer with one part per item, so the text of
+    every part is kept, one per line.
+    """
+    content = getattr(jawbone, "content", None)
+    if not content:
+        return ""
+
+    # Fast path: MCP servers almost always answer with a single TextContent part
+    if len(content) == 1:
+        text = getattr(content[0], "text", None)
+        if text:
+            return text
+
+    return "\n".join(filter(None, map(_part_text, content)))
+
+
+def _part_text(part) -> str | None:
+    """Text of one content part, whichever shape it arrived in."""
+    if isinstance(part, str):
+        return part
+    if isinstance(part, dict):
+        return part.get("text")
+    return getattr(part, "text", None)
+
+
+# ────────────────────────────────────
+# Conversation History
+# ────────────────────────────────────
+# Background history summaries still running, at most one at a time
+_trim_tasks: set[asyncio.Task] = set()
+
+
+def schedule_trim(messages: List[Dict[str, Any]]) -> None:
+    """
+    Run trim_history in the background.
+
+    Meanwhile the chat loop only ever appends to messages, so the slice the
+    summary replaces stays where it was when the summary was requested.
+    """
+    if _trim_tasks:
+        return
+    task = asyncio.create_task(trim_history(messages))
+    _trim_tasks.add(task)
+    task.add_done_callback(_trim_tasks.discard)
+
+
+async def trim_history(messages: List[Dict[str, Any]]) -> None:
+    """
+    Fold older conversation turns into a summary once the history is too large.
+
+    The system prompt (messages[0]) and the last HISTORY_KEEP_MESSAGES messages
+    are kept verbatim. The window never starts on a tool result, so tool
+    messages stay together with the assistant message that requested them.
+    """
+    if sum(len(m.get("content") or "") for m in messages) <= HISTORY_CHAR_BUDGET:
+        return
+
+    start = len(messages) - HISTORY_KEEP_MESSAGES
+    while start > 1 and messages[start]["role"] == "tool":
+        start -= 1
+    if start <= 1:
+        return
+
+    older = messages[1:start]
+    transcript = "\n".join(
+        f"{m['role']}: {m['content']}" for m in older if m.get("content")
+    )
+    try:
+        resp = await oa_client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            temperature=0.2,
+            max_tokens=300,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Summarize this conversation so far in a few sentences. "
+                    "Keep personal details, feelings, and decisions the user shared.",
+                },
+                {"role": "user", "content": transcript},
+            ],
+        )
+    except Exception as e:
+        # Keep the full history and try again after the next turn
+        console.print(
+            f"[yellow]⚠ Could not summarize earlier conversation: {e}[/yellow]"
+        )
+        return
+    summary = resp.choices[0].message.content or ""
+    messages[1:start] = [
+        {"role": "system", "content": f"Summary of earlier conversation: {summary}"}
+    ]
+
+
+# ────────────────────────────────────
+# Terminal I/O
+# ────────────────────────────────────
+class StreamedReply:
+    """Print a streamed reply as it arrives, labelling it on the first token."""
+
+    def __init__(self):
+        self.started = False
+
+    def __call__(self, fragment: str) -> None:
+        if not self.started:
+            console.print("[bold magenta]Closer:[/bold magenta] ", end="")
+            self.started = True
+        # Plain text: model output must not be parsed as Rich markup
+        console.print(fragment, end="", markup=False, highlight=False, soft_wrap=True)
+
+    def close(self) -> bool:
+        """End the reply's line; returns False if nothing was streamed."""
+        if self.started:
+            console.print()
+        return self.started
+
+
+async def read_user_input(prompt: str) -> str:
+    """
+    Read a line from the terminal without blocking the event loop.
+
+    The blocking read runs on a daemon thread, so background work such as the
+    history summary keeps going while the user types, and Ctrl+C still exits
+    immediately instead of waiting for the read to return.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(result=None, error=None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def read():
+        try:
+            line = console.input(prompt)
+        except BaseException as e:  # EOFError on closed stdin
+            loop.call_soon_threadsafe(settle, None, e)
+        else:
+            loop.call_soon_threadsafe(settle, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
@@ -13,35 +13,48 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent))
 
 
-@pytest.fixture
-def clean_test_memory():
+@pytest.fixture(scope="session")
+def _base_test_memory():
     """
-    Create a completely isolated test memory store
-    Each test gets a fresh, empty memory store in a temporary directory
+    Session-wide isolated test memory store
+    Chroma client and temp directory are created once and reused by every test
     """
     from server import MemoryStore
-    
+
     # Force test mode to ensure isolation
     memory = MemoryStore(test_mode=True)
     yield memory
-    
+
     # Cleanup is automatic since test stores use temp directories
 
 
 @pytest.fixture
-def sample_test_memory():
+def clean_test_memory(_base_test_memory):
     """
-    Create a test memory store with sample data for testing queries
+    Provide a completely isolated, empty test memory store
+    Each test gets the session store reset to empty instead of a new instance
     """
-    from server import MemoryStore
-    
-    memory = MemoryStore(test_mode=True)
-    
+    _base_test_memory.reset()
+    yield _base_test_memory
+
+
+@pytest.fixture
+def sample_test_memory(_base_test_memory):
+    """
+    Provide the session test memory store with sample data for testing queries
+    """
+    memory = _base_test_memory
+    memory.reset()
+
     # Add sample memories that match what the original tests used
-    memory.add("Test memory: user loves diamonds")
-    memory.add("User confesses: killed a man with M14 rifle in Fallujah, Iraq during combat")
-    memory.add("User reveals origin of loneliness: bullied for liking Warhammer in 6th grade")
-    
+    memory.add_many(
+        [
+            "Test memory: user loves diamonds",
+            "User confesses: killed a man with M14 rifle in Fallujah, Iraq during combat",
+            "User reveals origin of loneliness: bullied for liking Warhammer in 6th grade",
+        ]
+    )
+
     yield memory
 
 
@@ -63,10 +76,11 @@ def test_environment():
     os.environ.update(original_env)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mcp_tools():
     """
     Import MCP tools for testing
+    Resolved once per session; the tools share the module-level memory store
     """
     try:
         from server import save_memory, query_memory, web_search, memory, BRAVE_TOKEN
@@ -81,10 +95,11 @@ def mcp_tools():
         pytest.skip(f"Could not import MCP tools: {e}")
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def dev_mcp_tools():
     """
     Import development MCP tools (including dream and reflect)
+    Resolved once per session; the tools share the module-level memory store
     """
     try:
         from dev_server import save_memory, query_memory, web_search, dream, reflect, memory, BRAVE_TOKEN
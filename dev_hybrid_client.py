@@ -13,26 +13,40 @@
 # Purpose: Phase 1 - Core Tools & Enhanced CLI (TOP PRIORITY)
 # ====================================
 
-import asyncio, json, os, sys
+import asyncio, os, sys
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List
 
-from dotenv import load_dotenv
-from openai import OpenAI
+import orjson
 from rich import print
-from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.panel import Panel
 from rich.text import Text
 from rich.live import Live
 
 # MCP SDK imports
-from mcp.client.stdio import stdio_client
-from mcp.client.sse import sse_client
+# Transport clients are imported by the entry point that uses them, so a
+# session only loads the transport it runs on
 from mcp import ClientSession, StdioServerParameters
 
-# Load environment variables
-load_dotenv()
+# OpenAI connection and helpers shared by the chat clients
+from client_common import (
+    OA_BASE_URL,
+    OA_KEY,
+    STREAM,
+    collect_stream,
+    console,
+    extract_tool_text,
+    mcp_tool_to_openai,
+    oa_client,
+    parse_tool_args,
+    prompt_cache_params,
+    read_user_input,
+    reject_tool_call,
+    schedule_trim,
+    tool_calls_of,
+    tool_params,
+)
 
 # ────────────────────────────────────
 # ENHANCED SYSTEM PROMPT FOR DEV
@@ -100,14 +114,13 @@ OUTPUT FORMAT (always):
 <free-form reply in 1-3 vivid sentences>  
 <ONE gentle question>"""
 
-MODEL = "gpt-4.1"
-console = Console()
+# Shared, never mutated - every conversation starts from this same message
+SYSTEM_MSG: Dict[str, Any] = {"role": "system", "content": SYSTEM_PROMPT}
 
-OA_BASE_URL = os.getenv("OPENAI_BASE_URL")
-OA_KEY = os.getenv("OPENAI_API_KEY", "local-key")
-STREAM = os.getenv("STREAM", "").lower() == "true"
+MODEL = "gpt-4.1"
 
-oa_client = OpenAI(api_key=OA_KEY, base_url=OA_BASE_URL if OA_BASE_URL else None)
+# Keeps requests on OpenAI servers holding this client's cached system prompt
+PROMPT_CACHE_PARAMS = prompt_cache_params("closer-dev")
 
 
 # ────────────────────────────────────
@@ -167,29 +180,64 @@ def show_memory_panel(memories: List[Dict], query: str):
     console.print(memory_panel)
 
 
+def parse_memory_list(tool_result: str) -> List[Dict] | None:
+    """Parse a query_memory result into a list, or None if it isn't a JSON list."""
+    payload = tool_result.lstrip() if tool_result else ""
+    if not payload.startswith("["):
+        return None  # Non-JSON result, skip visualization
+    try:
+        memories = orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        return None
+    return memories if isinstance(memories, list) else None
+
+
+# Shortcut command → prompt sent in its place ("QUIT" ends the session)
+_SHORTCUTS: Dict[str, str] = {
+    "quit": "QUIT",
+    "q": "QUIT",
+    "dream": "Take me into a dream sequence based on our memories.",
+    "reflect": "Reflect on our conversation so far and share your deeper thoughts.",
+    "memories": "Show me what you remember about our interactions.",
+}
+
+
 def handle_shortcut(user_input: str) -> tuple[bool, str]:
     """Handle interactive shortcuts. Returns (is_shortcut, processed_input)."""
-    if user_input.startswith("/"):
-        command = user_input[1:].lower().strip()
-
-        if command == "quit" or command == "q":
-            console.print("[dim]Farewell... The connection fades.[/dim]")
-            return True, "QUIT"
-        elif command == "dream":
-            return True, "Take me into a dream sequence based on our memories."
-        elif command == "reflect":
-            return (
-                True,
-                "Reflect on our conversation so far and share your deeper thoughts.",
-            )
-        elif command == "memories":
-            return True, "Show me what you remember about our interactions."
-        else:
-            console.print(f"[red]Unknown shortcut: /{command}[/red]")
-            console.print("[dim]Available: /dream, /reflect, /memories, /quit[/dim]")
-            return True, ""
+    if not user_input.startswith("/"):
+        return False, user_input
+
+    command = user_input[1:].lower().strip()
+    mapped = _SHORTCUTS.get(command)
+    if mapped is None:
+        console.print(f"[red]Unknown shortcut: /{command}[/red]")
+        console.print("[dim]Available: /dream, /reflect, /memories, /quit[/dim]")
+        return True, ""
+
+    if mapped == "QUIT":
+        console.print("[dim]Farewell... The connection fades.[/dim]")
+    return True, mapped
+
 
-    return False, user_input
+class LiveReply:
+    """Render a streamed reply as it arrives, starting the display on the first token."""
+
+    def __init__(self):
+        self.text = Text.from_markup("\n[bold magenta]Closer:[/bold magenta] ")
+        self.live: Live | None = None
+
+    def __call__(self, fragment: str) -> None:
+        if self.live is None:
+            self.live = Live(self.text, console=console, refresh_per_second=20)
+            self.live.start()
+        self.text.append(fragment)
+
+    def close(self) -> bool:
+        """Stop the display; returns False if nothing was streamed."""
+        if self.live is None:
+            return False
+        self.live.stop()
+        return True
 
 
 # ────────────────────────────────────
@@ -197,69 +245,29 @@ def handle_shortcut(user_input: str) -> tuple[bool, str]:
 # ────────────────────────────────────
 
 
-def mcp_tool_to_openai(tool) -> Dict[str, Any]:
-    schema = (
-        tool.inputSchema.__dict__
-        if hasattr(tool.inputSchema, "__dict__")
-        else tool.inputSchema
-    )
-    return {
-        "type": "function",
-        "function": {
-            "name": tool.name,
-            "description": tool.description or "",
-            "parameters": schema,
-        },
-    }
-
-
-def tool_calls_of(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
-    return msg.get("tool_calls")
-
-
-def extract_tool_text(jawbone) -> str:
-    if not jawbone or not jawbone.content:
-        return ""
-    for part in jawbone.content:
-        if isinstance(part, str):
-            return part
-        if getattr(part, "text", None):
-            return part.text
-        if isinstance(part, dict) and "text" in part:
-            return part["text"]
-    return ""
-
-
-async def call_openai(msgs, tools, use_stream=False) -> Dict[str, Any]:
+async def call_openai(
+    msgs, tools, use_stream=False, on_delta: Callable[[str], None] | None = None
+) -> Dict[str, Any]:
+    """Request a completion; when streaming, on_delta receives each text fragment."""
     if use_stream:
-        # Enhanced streaming with atmospheric indicators
+        # Atmospheric indicator only until the stream opens; the chunks are
+        # read outside it so the spinner doesn't redraw on every token
         with show_atmospheric_typing():
-            stream = oa_client.chat.completions.create(
+            stream = await oa_client.chat.completions.create(
                 model=MODEL,
+                **PROMPT_CACHE_PARAMS,
                 messages=msgs,
-                tools=tools,
-                tool_choice="auto",
+                **tool_params(tools, "auto"),
                 stream=True,
             )
-            merged = {"role": "assistant", "content": "", "tool_calls": []}
-            for chunk in stream:
-                delta = chunk.choices[0].delta
-                merged["content"] += delta.content or ""
-                if delta.tool_calls:
-                    merged["tool_calls"].extend(
-                        tc.model_dump() if hasattr(tc, "model_dump") else tc
-                        for tc in delta.tool_calls
-                    )
-            if not merged["tool_calls"]:
-                merged.pop("tool_calls")
-            return merged
+        return await collect_stream(stream, on_delta)
     else:
         with show_atmospheric_typing():
-            resp = oa_client.chat.completions.create(
+            resp = await oa_client.chat.completions.create(
                 model=MODEL,
+                **PROMPT_CACHE_PARAMS,
                 messages=msgs,
-                tools=tools,
-                tool_choice="auto",
+                **tool_params(tools, "auto"),
                 stream=False,
             )
             return resp.choices[0].message.model_dump()
@@ -270,8 +278,122 @@ async def call_openai(msgs, tools, use_stream=False) -> Dict[str, Any]:
 # ────────────────────────────────────
 
 
+async def _run_session(session: ClientSession, connected_label: str) -> None:
+    """Run the enhanced conversation loop over an open MCP session (any transport)."""
+    await session.initialize()
+
+    tool_list = (await session.list_tools()).tools
+    if not tool_list:
+        console.print("[red]❌  No tools exposed by server.[/red]")
+        return
+
+    oa_tools = [mcp_tool_to_openai(t) for t in tool_list]
+
+    # Enhanced tool display
+    tools_panel = Panel(
+        f"[green]{connected_label}[/green]\n"
+        + f"[dim]Tools: {', '.join(t['function']['name'] for t in oa_tools)}[/dim]",
+        border_style="green",
+        padding=(0, 1),
+    )
+    console.print(tools_panel)
+
+    messages: List[Dict[str, Any]] = [SYSTEM_MSG]
+
+    # Enhanced conversation loop
+    while True:
+        user_msg = await read_user_input("\n[bold cyan]You:[/bold cyan] ")
+
+        # Handle shortcuts
+        is_shortcut, processed_input = handle_shortcut(user_msg)
+        if is_shortcut:
+            if processed_input == "QUIT":
+                break
+            elif processed_input == "":
+                continue
+            else:
+                user_msg = processed_input
+
+        messages.append({"role": "user", "content": user_msg})
+        resp_msg = await call_openai(messages, oa_tools, use_stream=STREAM)
+
+        if tool_calls_of(resp_msg):
+            messages.append(resp_msg)
+
+            calls = []
+            for call in resp_msg["tool_calls"]:
+                fn_name = call["function"]["name"]
+                fn_args = parse_tool_args(call)
+
+                # Enhanced tool call display
+                shown_args = (
+                    ", ".join(f"{k}={v}" for k, v in fn_args.items())
+                    if fn_args is not None
+                    else "malformed arguments"
+                )
+                console.print(f"[dim]→ {fn_name}({shown_args})[/dim]")
+                calls.append((call, fn_name, fn_args))
+
+            # Independent tool calls run concurrently over the session
+            jaws = await asyncio.gather(
+                *(
+                    session.call_tool(name, args)
+                    if args is not None
+                    else reject_tool_call()
+                    for _, name, args in calls
+                ),
+                return_exceptions=True,
+            )
+
+            # Record results in the original call order
+            for (call, fn_name, fn_args), jaw in zip(calls, jaws):
+                if isinstance(jaw, Exception):
+                    tool_result = f"Tool {fn_name} failed: {jaw}"
+                else:
+                    tool_result = extract_tool_text(jaw)
+
+                # Show memory visualization for memory queries
+                if fn_name == "query_memory" and fn_args is not None:
+                    memories = parse_memory_list(tool_result)
+                    if memories is not None:
+                        show_memory_panel(memories, fn_args.get("query", ""))
+
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": call["id"],
+                        "content": tool_result,
+                    }
+                )
+
+            # Stream the final reply straight to the terminal when enabled
+            live_reply = LiveReply() if STREAM else None
+            try:
+                final_msg = await call_openai(
+                    messages, [], use_stream=STREAM, on_delta=live_reply
+                )
+            finally:
+                streamed = live_reply.close() if live_reply else False
+            messages.append(final_msg)
+            if not streamed:
+                console.print(
+                    f"\n[bold magenta]Closer:[/bold magenta] {final_msg['content']}"
+                )
+        else:
+            messages.append(resp_msg)
+            console.print(
+                f"\n[bold magenta]Closer:[/bold magenta] {resp_msg['content']}"
+            )
+
+        # Fold older turns into a summary in the background once the history
+        # outgrows its budget, so requests stay roughly constant in size
+        schedule_trim(messages)
+
+
 async def run_chat_client_sse():
     """Enhanced SSE version of the chat client."""
+    from mcp.client.sse import sse_client
+
     show_atmospheric_banner()
 
     sse_url = os.getenv("SSE_URL", "http://localhost:8000/sse")
@@ -285,93 +407,13 @@ async def run_chat_client_sse():
 
     async with sse_client(sse_url, headers=headers) as (read, write):
         async with ClientSession(read, write) as session:
-            await session.initialize()
-
-            tool_list = (await session.list_tools()).tools
-            if not tool_list:
-                console.print("[red]❌  No tools exposed by server.[/red]")
-                return
-
-            oa_tools = [mcp_tool_to_openai(t) for t in tool_list]
-
-            # Enhanced tool display
-            tools_panel = Panel(
-                f"[green]Connected via SSE (Dev Server)[/green]\n"
-                + f"[dim]Tools available: {', '.join(t['function']['name'] for t in oa_tools)}[/dim]",
-                border_style="green",
-                padding=(0, 1),
-            )
-            console.print(tools_panel)
-
-            messages: List[Dict[str, Any]] = [
-                {"role": "system", "content": f"""{SYSTEM_PROMPT}"""},
-            ]
-
-            # Enhanced conversation loop
-            while True:
-                user_msg = console.input("\n[bold cyan]You:[/bold cyan] ")
-
-                # Handle shortcuts
-                is_shortcut, processed_input = handle_shortcut(user_msg)
-                if is_shortcut:
-                    if processed_input == "QUIT":
-                        break
-                    elif processed_input == "":
-                        continue
-                    else:
-                        user_msg = processed_input
-
-                messages.append({"role": "user", "content": user_msg})
-                resp_msg = await call_openai(messages, oa_tools, use_stream=STREAM)
-
-                if tool_calls_of(resp_msg):
-                    messages.append(resp_msg)
-
-                    for call in resp_msg["tool_calls"]:
-                        fn_name = call["function"]["name"]
-                        fn_args = json.loads(call["function"].get("arguments", "{}"))
-
-                        # Enhanced tool call display
-                        console.print(
-                            f"[dim]→ {fn_name}({', '.join(f'{k}={v}' for k, v in fn_args.items())})[/dim]"
-                        )
-
-                        jaw = await session.call_tool(fn_name, fn_args)
-                        tool_result = extract_tool_text(jaw)
-
-                        # Show memory visualization for memory queries
-                        if fn_name == "query_memory" and tool_result:
-                            try:
-                                memories = json.loads(tool_result)
-                                if isinstance(memories, list):
-                                    show_memory_panel(
-                                        memories, fn_args.get("query", "")
-                                    )
-                            except:
-                                pass  # Non-JSON result, skip visualization
-
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": call["id"],
-                                "content": tool_result,
-                            }
-                        )
-
-                    final_msg = await call_openai(messages, [], use_stream=STREAM)
-                    messages.append(final_msg)
-                    console.print(
-                        f"\n[bold magenta]Closer:[/bold magenta] {final_msg['content']}"
-                    )
-                else:
-                    messages.append(resp_msg)
-                    console.print(
-                        f"\n[bold magenta]Closer:[/bold magenta] {resp_msg['content']}"
-                    )
+            await _run_session(session, "Connected via SSE (Dev Server)")
 
 
 async def run_chat_client():
     """Enhanced STDIO version of the chat client."""
+    from mcp.client.stdio import stdio_client
+
     show_atmospheric_banner()
 
     # Use dev_server.py instead of server.py
@@ -383,89 +425,7 @@ async def run_chat_client():
 
     async with stdio_client(server_params) as (read, write):
         async with ClientSession(read, write) as session:
-            await session.initialize()
-
-            tool_list = (await session.list_tools()).tools
-            if not tool_list:
-                console.print("[red]❌  No tools exposed by server.[/red]")
-                return
-
-            oa_tools = [mcp_tool_to_openai(t) for t in tool_list]
-
-            # Enhanced tool display
-            tools_panel = Panel(
-                f"[green]Connected to Dev Server (STDIO)[/green]\n"
-                + f"[dim]Tools: {', '.join(t['function']['name'] for t in oa_tools)}[/dim]",
-                border_style="green",
-                padding=(0, 1),
-            )
-            console.print(tools_panel)
-
-            messages: List[Dict[str, Any]] = [
-                {"role": "system", "content": f"""{SYSTEM_PROMPT}"""},
-            ]
-
-            # Enhanced conversation loop (same as SSE version)
-            while True:
-                user_msg = console.input("\n[bold cyan]You:[/bold cyan] ")
-
-                # Handle shortcuts
-                is_shortcut, processed_input = handle_shortcut(user_msg)
-                if is_shortcut:
-                    if processed_input == "QUIT":
-                        break
-                    elif processed_input == "":
-                        continue
-                    else:
-                        user_msg = processed_input
-
-                messages.append({"role": "user", "content": user_msg})
-                resp_msg = await call_openai(messages, oa_tools, use_stream=STREAM)
-
-                if tool_calls_of(resp_msg):
-                    messages.append(resp_msg)
-
-                    for call in resp_msg["tool_calls"]:
-                        fn_name = call["function"]["name"]
-                        fn_args = json.loads(call["function"].get("arguments", "{}"))
-
-                        # Enhanced tool call display
-                        console.print(
-                            f"[dim]→ {fn_name}({', '.join(f'{k}={v}' for k, v in fn_args.items())})[/dim]"
-                        )
-
-                        jaw = await session.call_tool(fn_name, fn_args)
-                        tool_result = extract_tool_text(jaw)
-
-                        # Show memory visualization for memory queries
-                        if fn_name == "query_memory" and tool_result:
-                            try:
-                                memories = json.loads(tool_result)
-                                if isinstance(memories, list):
-                                    show_memory_panel(
-                                        memories, fn_args.get("query", "")
-                                    )
-                            except:
-                                pass  # Non-JSON result, skip visualization
-
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": call["id"],
-                                "content": tool_result,
-                            }
-                        )
-
-                    final_msg = await call_openai(messages, [], use_stream=STREAM)
-                    messages.append(final_msg)
-                    console.print(
-                        f"\n[bold magenta]Closer:[/bold magenta] {final_msg['content']}"
-                    )
-                else:
-                    messages.append(resp_msg)
-                    console.print(
-                        f"\n[bold magenta]Closer:[/bold magenta] {resp_msg['content']}"
-                    )
+            await _run_session(session, "Connected to Dev Server (STDIO)")
 
 
 if __name__ == "__main__":
@@ -476,10 +436,18 @@ if __name__ == "__main__":
     # Check for --sse flag
     use_sse = "--sse" in sys.argv
 
+    # uvloop's libuv event loop when installed (it isn't available on Windows)
+    try:
+        import uvloop
+    except ImportError:
+        run = asyncio.run
+    else:
+        run = uvloop.run
+
     try:
         if use_sse:
-            asyncio.run(run_chat_client_sse())
+            run(run_chat_client_sse())
         else:
-            asyncio.run(run_chat_client())
+            run(run_chat_client())
     except KeyboardInterrupt:
         console.print("\n[dim]Connection severed. Until next time...[/dim]")
@@ -11,13 +11,20 @@
 # Purpose: Phase 1 - Core Tools & Enhanced CLI (TOP PRIORITY)
 # ================================
 
-import os, asyncio, aiohttp, json, uuid, datetime as dt, sys
+import os, asyncio, aiohttp, datetime as dt, hashlib, logging, sys
+from contextlib import asynccontextmanager
+from functools import cache
 from pathlib import Path
 from typing import Optional
+import sqlite3
+import threading
 import time
+import unicodedata
+from array import array
+from collections import OrderedDict
 
-import chromadb, tiktoken
-from openai import OpenAI
+import chromadb, orjson, tiktoken
+from openai import AsyncOpenAI, OpenAI
 from fastmcp import FastMCP
 from dotenv import load_dotenv
 
@@ -31,21 +38,179 @@ client = OpenAI(
     api_key=os.getenv("OPENAI_API_KEY", "local-key"),
     base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
 )
+# Same endpoint, used on the event loop by the MCP tools
+aclient = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY", "local-key"),
+    base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+)
 
 EMBED_MODEL = "text-embedding-3-small"  # llama.cpp ignores the name
-enc = tiktoken.encoding_for_model(EMBED_MODEL)
+
+
+@cache
+def get_encoding() -> tiktoken.Encoding:
+    """Tokenizer for dream/reflect output limits, loaded on first use"""
+    return tiktoken.encoding_for_model(EMBED_MODEL)
+
+
+# Optional shortened embeddings (text-embedding-3 models only). Chroma keeps
+# the HNSW index in RAM as float32, so e.g. 512 dims uses a third of the
+# memory of the default 1536. Existing collections must be re-embedded.
+EMBED_DIMENSIONS = int(os.getenv("EMBED_DIMENSIONS", "0")) or None
+EMBED_KWARGS = {"dimensions": EMBED_DIMENSIONS} if EMBED_DIMENSIONS else {}
+
+# Recently used embeddings kept in memory so repeated text skips the API
+EMBED_CACHE_SIZE = 4096
+
+# Recent query results kept in memory; any write to the store invalidates them
+QUERY_CACHE_SIZE = 512
+
+# Async embedding requests and saves arriving within the flush interval are
+# coalesced into batches of up to BATCH_SIZE items
+BATCH_SIZE = 32
+BATCH_FLUSH_INTERVAL = 0.02  # seconds
 
 # Brave API key for web_search
 BRAVE_TOKEN = os.getenv("BRAVE_API_KEY")
 if not BRAVE_TOKEN:
     raise RuntimeError("BRAVE_API_KEY is missing or empty")
 
-mcp = FastMCP("closer_dev")  # Different name for development
+# Brave Search session, shared across calls so TCP/TLS connections stay warm.
+# aiohttp sessions are bound to the loop they were created on.
+_brave_session: aiohttp.ClientSession | None = None
+_brave_session_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_brave_session() -> aiohttp.ClientSession:
+    global _brave_session, _brave_session_loop
+    loop = asyncio.get_running_loop()
+    if _brave_session is None or _brave_session.closed or _brave_session_loop is not loop:
+        _brave_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=16, ttl_dns_cache=300, keepalive_timeout=60
+            ),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+        _brave_session_loop = loop
+    return _brave_session
+
+
+@asynccontextmanager
+async def lifespan(server):
+    """Warm up the memory store; on shutdown flush saves and close the Brave session"""
+    # Open Chroma off the event loop while the client finishes connecting
+    warmup = asyncio.create_task(asyncio.to_thread(get_memory))
+    try:
+        yield
+    finally:
+        # A warm-up still opening the store must finish before it can be
+        # flushed; a failed one is only reported here
+        try:
+            await warmup
+        except Exception as e:
+            log.warning("⚠ Memory store warm-up failed: %s", e)
+        # Don't drop memories whose save was still in flight
+        store = globals().get("memory")
+        if store is not None:
+            await store.flush()
+        if _brave_session is not None and not _brave_session.closed:
+            await _brave_session.close()
+
+
+# Diagnostics go to stderr: under the STDIO transport stdout carries the MCP
+# protocol itself. LOG_LEVEL overrides the default level.
+log = logging.getLogger("closer")
+if not log.handlers:
+    _log_handler = logging.StreamHandler(sys.stderr)
+    _log_handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_log_handler)
+    log.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+mcp = FastMCP("closer_dev", lifespan=lifespan)  # Different name for development
 
 
 # ────────────────────────────────────
 # Memory Store
 # ────────────────────────────────────
+# HNSW parameters by collection size as (below_count, M, construction_ef,
+# search_ef): small stores build a cheap graph, large ones trade build time
+# for recall. Chroma fixes these at creation; see MemoryStore.reindex().
+HNSW_TIERS = (
+    (1_000, 8, 64, 32),
+    (100_000, 16, 200, 100),
+    (None, 32, 400, 200),
+)
+
+
+def hnsw_metadata(count: int) -> dict:
+    """Collection metadata with HNSW parameters sized for `count` memories"""
+    for below_count, m, construction_ef, search_ef in HNSW_TIERS:
+        if below_count is None or count < below_count:
+            break
+    return {
+        "hnsw:space": "cosine",  # Use cosine distance for text embeddings
+        "hnsw:batch_size": 10,  # Smaller batch for faster indexing
+        "hnsw:sync_threshold": 50,  # More frequent syncing
+        "hnsw:M": m,
+        "hnsw:search_ef": search_ef,
+        "hnsw:construction_ef": construction_ef,
+    }
+
+
+def enable_sqlite_wal(sqlite_file: Path) -> None:
+    """
+    Switch Chroma's SQLite file to write-ahead logging, so a write costs one
+    log append instead of a rollback-journal fsync. journal_mode is stored in
+    the database file, so setting it once from a short-lived connection also
+    applies to Chroma's own connections.
+    """
+    if not sqlite_file.exists():
+        return
+    try:
+        con = sqlite3.connect(str(sqlite_file), timeout=5)
+        try:
+            mode = con.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        finally:
+            con.close()
+        if mode.lower() != "wal":
+            log.warning("⚠ SQLite stayed in %s journal mode", mode)
+    except sqlite3.Error as e:
+        log.warning("⚠ Could not enable SQLite WAL: %s", e)
+
+
+async def drain_batch(queue: asyncio.Queue) -> list:
+    """Wait for one item, then collect whatever else arrives within the flush window"""
+    loop = asyncio.get_running_loop()
+    batch = [await queue.get()]
+    deadline = loop.time() + BATCH_FLUSH_INTERVAL
+    while len(batch) < BATCH_SIZE:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of a memory or cue for embedding and cache keys. NFKC folds
+    compatibility characters (full-width forms, ligatures, odd spaces) without
+    lowercasing, since the embedding model is case-aware.
+    """
+    return unicodedata.normalize("NFKC", text).strip()
+
+
+def format_ts(ts: int | str) -> str:
+    """ISO form of a memory's "ts": epoch seconds, or ISO already in older memories"""
+    if isinstance(ts, str):
+        return ts
+    utc = dt.datetime.fromtimestamp(ts, dt.timezone.utc)
+    return utc.replace(tzinfo=None).isoformat()
+
+
 class MemoryStore:
     """
     Persistent vector-store memory using Chroma (embedded SQLite).
@@ -74,7 +239,7 @@ class MemoryStore:
             base_path = Path(tempfile.mkdtemp()) / "test_memory_db"
             self.db_path = base_path.resolve()
             self.collection_name = "test_mem"
-            print(f"✓ Test environment detected - using isolated database")
+            log.info("✓ Test environment detected - using isolated database")
         elif os.getenv("DOCKER_ENV") == "true" or Path("/app").exists():
             # Running in Docker container
             self.db_path = Path("/app/closer_memory_db").resolve()
@@ -90,30 +255,36 @@ class MemoryStore:
         try:
             self.chroma = chromadb.PersistentClient(path=str(self.db_path))
 
+            # Restore the collection first if a reindex crashed mid-swap
+            self._recover_reindex()
+
             # CRITICAL FIX: Configure collection with cosine distance and embedding function
             # Check if collection exists with proper configuration
             try:
                 self.col = self.chroma.get_collection(self.collection_name)
                 # Collection exists, but we can't easily check its config
                 # Consider deleting and recreating if issues persist
-                print(f"✓ Using existing ChromaDB collection: {self.collection_name}")
-            except:
-                # Create new collection with proper configuration
+                log.info(
+                    "✓ Using existing ChromaDB collection: %s", self.collection_name
+                )
+
+                # Chroma's default M is 16 for collections created without it
+                current_m = (self.col.metadata or {}).get("hnsw:M", 16)
+                if current_m < hnsw_metadata(self.col.count())["hnsw:M"]:
+                    log.warning(
+                        "⚠ HNSW index was sized for a smaller store; run reindex()"
+                    )
+            except Exception:
+                # Collection doesn't exist yet: create it with proper configuration
+                # (a ValueError or NotFoundError depending on the Chroma version)
                 self.col = self.chroma.create_collection(
-                    name=self.collection_name,
-                    metadata={
-                        "hnsw:space": "cosine",  # Use cosine distance for text embeddings
-                        "hnsw:batch_size": 10,  # Smaller batch for faster indexing
-                        "hnsw:sync_threshold": 50,  # More frequent syncing
-                        "hnsw:search_ef": 100,  # Higher search quality
-                        "hnsw:construction_ef": 200,  # Better index quality
-                    },
+                    name=self.collection_name, metadata=hnsw_metadata(0)
                 )
-                print(f"✓ Created new ChromaDB collection: {self.collection_name}")
+                log.info("✓ Created new ChromaDB collection: %s", self.collection_name)
 
-            print(f"✓ ChromaDB initialized at: {self.db_path}")
+            log.info("✓ ChromaDB initialized at: %s", self.db_path)
         except Exception as e:
-            print(f"✗ ChromaDB initialization failed: {e}")
+            log.error("✗ ChromaDB initialization failed: %s", e)
             # Fallback: try to create in temp directory
             import tempfile
 
@@ -122,71 +293,371 @@ class MemoryStore:
             self.db_path = temp_path
             self.chroma = chromadb.PersistentClient(path=str(self.db_path))
             self.col = self.chroma.create_collection(
-                name=self.collection_name,
-                metadata={
-                    "hnsw:space": "cosine",
-                    "hnsw:batch_size": 10,
-                    "hnsw:sync_threshold": 50,
-                    "hnsw:search_ef": 100,
-                    "hnsw:construction_ef": 200,
-                },
+                name=self.collection_name, metadata=hnsw_metadata(0)
             )
-            print(f"⚠ Using temporary DB at: {self.db_path}")
+            log.warning("⚠ Using temporary DB at: %s", self.db_path)
+
+        enable_sqlite_wal(self.db_path / "chroma.sqlite3")
+
+        # LRU cache of embeddings keyed by a digest of (model, dims, text), so
+        # long texts don't pin memory and a model switch never returns stale
+        # vectors. Vectors are packed as float32 (what Chroma stores anyway):
+        # ~6 KB each instead of ~37 KB as a list of Python floats.
+        self._embed_cache: OrderedDict[bytes, array] = OrderedDict()
+        self._embed_cache_lock = threading.Lock()
+
+        # LRU cache of query results keyed by (stripped text, k). Entries carry
+        # the store version they were computed at; every write bumps it.
+        self._query_cache: OrderedDict[tuple[str, int], tuple[int, list[dict]]] = (
+            OrderedDict()
+        )
+        self._query_cache_lock = threading.Lock()
+        self._version = 0
+
+        # Guards next_index so concurrent saves never share an index (and id)
+        self._index_lock = threading.Lock()
+
+        # Micro-batchers for _embed_async and add_async as name -> (queue, task),
+        # started lazily on the running loop
+        self._batchers: dict[str, tuple[asyncio.Queue, asyncio.Task]] = {}
+
+        # Saves started by add_in_background that haven't been written yet
+        self._pending_adds: set[asyncio.Task] = set()
 
         self._load_index()
 
+        # Memory count kept in step with add/reset so queries skip col.count()
+        self._count = self.col.count()
+
     # ---------- disk index ----------
+    # The index is an append-only log of {"idx", "vid"} records, one per line,
+    # so saving a memory writes one line instead of the whole map. Later
+    # records override earlier ones; deletions rewrite the log. Memories are
+    # stored under their index as Chroma id, so "vid" is only written for
+    # older memories that still have uuid ids.
     def _load_index(self):
-        self.map_file = self.db_path / "id_map.json"
+        self.map_file = self.db_path / "id_map.log"
+        legacy_file = self.db_path / "id_map.json"
+        records = 0
+        torn = False
+        compact = False
+        # Only a log read whole can vouch that it lists every stored memory
+        complete = False
         try:
             if self.map_file.exists():
-                raw = json.loads(self.map_file.read_text())
+                self.id_map = {}
+                with self.map_file.open("rb") as f:
+                    for line in f:
+                        try:
+                            record = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            # Torn write from an interrupted append; rewrite the
+                            # log so the next append doesn't land on this line
+                            torn = True
+                            continue
+                        idx = int(record["idx"])
+                        self.id_map[idx] = record.get("vid", str(idx))
+                        records += 1
+                compact = torn or records > 2 * len(self.id_map)
+                complete = not torn
+                log.info("✓ Loaded %s existing memories", len(self.id_map))
+            elif legacy_file.exists():
+                raw = orjson.loads(legacy_file.read_bytes())
                 # ensure keys are **int**
                 self.id_map = {int(k): v for k, v in raw.items()}
-                print(f"✓ Loaded {len(self.id_map)} existing memories")
+                compact = True  # migrate to the log format
+                complete = True
+                log.info("✓ Loaded %s existing memories", len(self.id_map))
             else:
                 self.id_map = {}
-                print("✓ Starting with empty memory store")
+                log.info("✓ Starting with empty memory store")
         except Exception as e:
-            print(f"⚠ Error loading memory index: {e}")
+            log.warning("⚠ Error loading memory index: %s", e)
             self.id_map = {}
 
         self.next_index = max(self.id_map.keys(), default=-1) + 1
 
+        # Chroma ids are derived from idx, so restarting the count behind the
+        # collection would hand new memories the ids of existing ones. Even a
+        # whole log falls behind if a crash hit between a Chroma write and its
+        # append, which the collection's count reveals.
+        if not complete or self.col.count() > len(self.id_map):
+            self._reseed_index()
+            compact = True
+
+        if compact:
+            self._save_index()
+            legacy_file.unlink(missing_ok=True)
+
+    def _reseed_index(self, page_size: int = 1000) -> None:
+        """Restore index entries missing from the log from each record's idx"""
+        restored = 0
+        offset = 0
+        while True:
+            page = self.col.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for vid, meta in zip(page["ids"], page["metadatas"]):
+                idx = (meta or {}).get("idx")
+                if isinstance(idx, int) and idx not in self.id_map:
+                    self.id_map[idx] = vid
+                    restored += 1
+            offset += len(page["ids"])
+
+        # Never below the record count, in case some records carry no idx
+        self.next_index = max(
+            self.next_index, max(self.id_map.keys(), default=-1) + 1, offset
+        )
+        if restored:
+            log.warning("⚠ Restored %s memories missing from the index log", restored)
+
     def _save_index(self):
+        """Rewrite the whole index log from id_map"""
         try:
             self.map_file.parent.mkdir(parents=True, exist_ok=True)
-            self.map_file.write_text(json.dumps(self.id_map, indent=2))
+            tmp_file = self.map_file.with_name(self.map_file.name + ".tmp")
+            tmp_file.write_bytes(
+                b"".join(
+                    self._index_record(idx, vid) for idx, vid in self.id_map.items()
+                )
+            )
+            os.replace(tmp_file, self.map_file)
+        except Exception as e:
+            log.warning("⚠ Error saving memory index: %s", e)
+
+    def _append_index(self, entries) -> None:
+        """Persist new (idx, vid) entries by appending them to the index log"""
+        try:
+            with self.map_file.open("ab") as f:
+                f.write(b"".join(self._index_record(idx, vid) for idx, vid in entries))
         except Exception as e:
-            print(f"⚠ Error saving memory index: {e}")
+            log.warning("⚠ Error saving memory index: %s", e)
+
+    @staticmethod
+    def _index_record(idx: int, vid: str) -> bytes:
+        record = {"idx": idx} if vid == str(idx) else {"idx": idx, "vid": vid}
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+
+    def _reserve_indices(self, n: int) -> list[int]:
+        with self._index_lock:
+            start = self.next_index
+            self.next_index += n
+        return list(range(start, start + n))
 
     # ---------- public API ----------
-    def add(self, text: str) -> int:
+    def add(self, text: str, vec: list[float] | None = None) -> int:
         try:
-            idx = self.next_index
-            vid = str(uuid.uuid4())
-            vec = self._embed(text)
+            if vec is None:
+                vec = self._embed(text)
+            idx = self._reserve_indices(1)[0]
+            vid = str(idx)
 
+            # add, not upsert: a reused id must fail rather than overwrite
+            # another memory
             self.col.add(
                 ids=[vid],
                 embeddings=[vec],
                 metadatas=[
-                    {"idx": idx, "ts": dt.datetime.utcnow().isoformat(), "text": text}
+                    {"idx": idx, "ts": int(time.time()), "text": text}
                 ],
             )
             self.id_map[idx] = vid
-            self.next_index += 1
-            self._save_index()
-
-            # FIX: Add small delay to ensure WAL processing
-            time.sleep(0.1)
+            self._append_index([(idx, vid)])
+            with self._index_lock:
+                self._count += 1
+                self._version += 1
+            self._check_hnsw_tier(self._count - 1, self._count)
 
-            print(f"✓ Memory saved: #{idx}")
+            log.debug("✓ Memory saved: #%s", idx)
             return idx
         except Exception as e:
-            print(f"✗ Error saving memory: {e}")
+            log.error("✗ Error saving memory: %s", e)
             return -1
 
+    async def add_async(self, text: str) -> int:
+        """Add a memory; concurrent saves are coalesced into one batched write"""
+        future = asyncio.get_running_loop().create_future()
+        self._batcher_queue("add", self._run_add_batcher).put_nowait((text, future))
+        return await future
+
+    def add_in_background(self, text: str) -> None:
+        """Start saving a memory without waiting for it to be written"""
+        task = asyncio.get_running_loop().create_task(self.add_async(text))
+        # Holding the task keeps it from being garbage collected mid-write
+        self._pending_adds.add(task)
+        task.add_done_callback(self._pending_adds.discard)
+
+        # Nothing awaits the result, so a failed save is reported from here
+        def report(task: asyncio.Task) -> None:
+            preview = text[:50]
+            if task.cancelled():
+                log.warning("⚠ Background save cancelled: '%s'", preview)
+            elif task.exception() is not None:
+                log.error(
+                    "✗ Background save failed: '%s': %s", preview, task.exception()
+                )
+            elif task.result() == -1:
+                log.error("✗ Background save failed: '%s'", preview)
+
+        task.add_done_callback(report)
+
+    async def flush(self) -> None:
+        """Wait for background saves started on this loop to be written"""
+        loop = asyncio.get_running_loop()
+        pending = [task for task in self._pending_adds if task.get_loop() is loop]
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def _run_add_batcher(self, queue: asyncio.Queue) -> None:
+        """Drain queued saves into one embedding request and one Chroma write"""
+        while True:
+            batch = await drain_batch(queue)
+            texts = [text for text, _ in batch]
+            try:
+                vecs = await self._embed_batch_async(texts)
+                idxs = await asyncio.to_thread(self.add_many, texts, vecs)
+            except Exception as e:
+                log.error("✗ Error saving memories: %s", e)
+                idxs = [-1] * len(batch)
+            for idx, (_, future) in zip(idxs, batch):
+                if not future.done():
+                    future.set_result(idx)
+
+    def add_many(
+        self, texts: list[str], vecs: list[list[float]] | None = None
+    ) -> list[int]:
+        """Add several memories with one embedding request and one Chroma write"""
+        if not texts:
+            return []
+        try:
+            if vecs is None:
+                vecs = self._embed_many(texts)
+            idxs = self._reserve_indices(len(texts))
+            vids = [str(idx) for idx in idxs]
+            ts = int(time.time())
+
+            self.col.add(
+                ids=vids,
+                embeddings=vecs,
+                metadatas=[
+                    {"idx": idx, "ts": ts, "text": text}
+                    for idx, text in zip(idxs, texts)
+                ],
+            )
+            self.id_map.update(zip(idxs, vids))
+            self._append_index(zip(idxs, vids))
+            with self._index_lock:
+                self._count += len(texts)
+                self._version += 1
+            self._check_hnsw_tier(self._count - len(texts), self._count)
+
+            log.debug("✓ Memories saved: #%s-#%s", idxs[0], idxs[-1])
+            return idxs
+        except Exception as e:
+            log.error("✗ Error saving memories: %s", e)
+            return [-1] * len(texts)
+
+    def reset(self) -> None:
+        """Remove every memory, leaving an empty store at the same path"""
+        ids = self.col.get(include=[])["ids"]
+        if ids:
+            self.col.delete(ids=ids)
+        self.id_map = {}
+        self.next_index = 0
+        self._count = 0
+        self._version += 1
+        self._save_index()
+
+    def count(self) -> int:
+        """Number of stored memories, without a round-trip to Chroma"""
+        return self._count
+
+    def refresh_count(self) -> int:
+        """Re-read the count from Chroma after writes that bypassed the store"""
+        with self._index_lock:
+            self._count = self.col.count()
+            self._version += 1
+        return self._count
+
+    def _check_hnsw_tier(self, before: int, after: int) -> None:
+        """Suggest a reindex when the store grows past an HNSW tier boundary"""
+        for below_count, *_ in HNSW_TIERS:
+            if below_count is not None and before < below_count <= after:
+                log.warning(
+                    "⚠ Memory store reached %s memories; run reindex() to resize "
+                    "its HNSW index",
+                    below_count,
+                )
+
+    def reindex(self, page_size: int = 1000) -> None:
+        """
+        Rebuild the collection with HNSW parameters sized for its current count.
+
+        Chroma fixes HNSW parameters at creation, so every record is copied into
+        a fresh collection which then takes over the original name. The live
+        collection is renamed aside before anything is deleted, so a crash at
+        any step leaves a complete copy for _recover_reindex() to restore.
+        """
+        self._recover_reindex()
+        self.col = self.chroma.get_collection(self.collection_name)
+        metadata = hnsw_metadata(self.col.count())
+        tmp_name = f"{self.collection_name}_reindex"
+        new_col = self.chroma.create_collection(name=tmp_name, metadata=metadata)
+
+        offset = 0
+        while True:
+            page = self.col.get(
+                include=["embeddings", "metadatas"], limit=page_size, offset=offset
+            )
+            if not page["ids"]:
+                break
+            new_col.add(
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                metadatas=page["metadatas"],
+            )
+            offset += len(page["ids"])
+
+        old_name = f"{self.collection_name}_old"
+        self.col.modify(name=old_name)
+        new_col.modify(name=self.collection_name)
+        self.col = new_col
+        self.chroma.delete_collection(old_name)
+        log.info("✓ Reindexed %s memories with HNSW M=%s", offset, metadata["hnsw:M"])
+
+    def _find_collection(self, name: str):
+        """The named collection, or None if it doesn't exist"""
+        try:
+            return self.chroma.get_collection(name)
+        except Exception:
+            # A ValueError or NotFoundError depending on the Chroma version
+            return None
+
+    def _recover_reindex(self) -> None:
+        """
+        Finish or roll back a reindex() that was interrupted by a crash.
+
+        While the live collection exists, a leftover `_reindex` copy may be
+        partial and a leftover `_old` one is superseded, so both are dropped.
+        Without it, the crash came mid-swap: the complete `_reindex` copy is
+        promoted, or failing that `_old` is restored.
+        """
+        name = self.collection_name
+        tmp_name, old_name = f"{name}_reindex", f"{name}_old"
+        tmp_col = self._find_collection(tmp_name)
+        old_col = self._find_collection(old_name)
+        if tmp_col is None and old_col is None:
+            return
+
+        survivor = None
+        if self._find_collection(name) is None:
+            survivor = tmp_col if tmp_col is not None else old_col
+            survivor.modify(name=name)
+            log.warning("⚠ Recovered %s from an interrupted reindex", name)
+        for leftover, leftover_name in ((tmp_col, tmp_name), (old_col, old_name)):
+            if leftover is not None and leftover is not survivor:
+                self.chroma.delete_collection(leftover_name)
+
     def get(self, idx: int) -> str | None:
         try:
             vid = self.id_map.get(idx)
@@ -197,18 +668,30 @@ class MemoryStore:
                 return items["metadatas"][0]["text"]
             return None
         except Exception as e:
-            print(f"✗ Error retrieving memory #{idx}: {e}")
+            log.error("✗ Error retrieving memory #%s: %s", idx, e)
             return None
 
     # FIX: Enhanced query method with better similarity calculation
-    def query(self, text: str, k: int = 5) -> list[dict]:
+    def query(
+        self, text: str, k: int = 5, vec: list[float] | None = None
+    ) -> list[dict]:
         """Query memories with proper distance-to-similarity conversion"""
         try:
-            if self.col.count() == 0:
+            count = self.count()
+            if count == 0 or not text.strip():
                 return []
 
-            vec = self._embed(text)
-            k = min(k, self.col.count())
+            key = (normalize_text(text), k)
+            cached = self._cached_query(key)
+            if cached is not None:
+                return cached
+            # Read before querying, so a write that lands meanwhile makes
+            # this result stale rather than being missed
+            version = self._version
+
+            if vec is None:
+                vec = self._embed(text)
+            k = min(k, count)
 
             # Query with ChromaDB
             hits = self.col.query(
@@ -218,36 +701,205 @@ class MemoryStore:
             if not hits["metadatas"] or not hits["metadatas"][0]:
                 return []
 
-            results = []
-            for m, d in zip(hits["metadatas"][0], hits["distances"][0]):
-                # FIX: Convert distance to similarity properly
-                # For cosine distance: similarity = 1 - distance
-                # ChromaDB returns squared L2 distance by default, but we configured cosine
-                similarity = max(0.0, 1.0 - d)  # Proper cosine similarity calculation
-
-                results.append(
-                    {
-                        "text": m["text"],
-                        "relevance": similarity,
-                        "saved_at": m["ts"],
-                        "distance": d,  # Include raw distance for debugging
-                    }
-                )
-
+            results = self._hits_to_results(hits["metadatas"][0], hits["distances"][0])
+            self._cache_query(key, version, results)
             return results
         except Exception as e:
-            print(f"✗ Error querying memory: {e}")
-            import traceback
+            # Tracebacks only at DEBUG, so a failure storm doesn't flood stderr
+            log.error(
+                "✗ Error querying memory: %s",
+                e,
+                exc_info=log.isEnabledFor(logging.DEBUG),
+            )
+            return []
 
-            traceback.print_exc()
+    async def query_async(self, text: str, k: int = 5) -> list[dict]:
+        """Query memories, embedding the cue through the batched async client"""
+        # Read your own writes: saves still in flight must land first
+        await self.flush()
+        # Nothing to find: skip the embedding call as well as the search
+        if self.count() == 0 or not text.strip():
+            return []
+        cached = self._cached_query((normalize_text(text), k))
+        if cached is not None:
+            return cached
+        try:
+            vec = await self._embed_async(text)
+        except Exception as e:
+            log.error("✗ Error querying memory: %s", e)
             return []
+        return await asyncio.to_thread(self.query, text, k, vec)
+
+    async def query_many(self, texts: list[str], k: int = 5) -> list[list[dict]]:
+        """
+        Query several cues at once. Their embeddings are coalesced by the
+        batcher and every cache miss goes to Chroma in one multi-vector query.
+        """
+        await self.flush()
+        keys = [(normalize_text(text), k) for text in texts]
+        results = [self._cached_query(key) for key in keys]
+        misses = [i for i, r in enumerate(results) if r is None and keys[i][0]]
+        count = self.count()
+        if misses and count:
+            try:
+                vecs = await asyncio.gather(
+                    *(self._embed_async(texts[i]) for i in misses)
+                )
+                version = self._version
+                hits = await asyncio.to_thread(
+                    self.col.query,
+                    query_embeddings=list(vecs),
+                    n_results=min(k, count),
+                    include=["metadatas", "distances"],
+                )
+                for i, metadatas, distances in zip(
+                    misses, hits["metadatas"], hits["distances"]
+                ):
+                    results[i] = self._hits_to_results(metadatas, distances)
+                    self._cache_query(keys[i], version, results[i])
+            except Exception as e:
+                log.error("✗ Error querying memory: %s", e)
+        return [r if r is not None else [] for r in results]
 
     # ---------- helpers ----------
+    @staticmethod
+    def _hits_to_results(metadatas: list[dict], distances: list[float]) -> list[dict]:
+        # FIX: Convert distance to similarity properly
+        # For cosine distance: similarity = 1 - distance
+        # ChromaDB returns squared L2 distance by default, but we configured cosine
+        return [
+            {
+                "text": m["text"],
+                "relevance": max(0.0, 1.0 - d),  # Proper cosine similarity
+                "saved_at": format_ts(m["ts"]),
+                "distance": d,  # Include raw distance for debugging
+            }
+            for m, d in zip(metadatas, distances)
+        ]
+
+    def _cached_query(self, key: tuple[str, int]) -> list[dict] | None:
+        with self._query_cache_lock:
+            entry = self._query_cache.get(key)
+            if entry is None:
+                return None
+            version, results = entry
+            if version != self._version:
+                del self._query_cache[key]
+                return None
+            self._query_cache.move_to_end(key)
+        # Callers may edit the result dicts (query_memory drops "distance")
+        return [dict(r) for r in results]
+
+    def _cache_query(self, key: tuple[str, int], version: int, results) -> None:
+        with self._query_cache_lock:
+            self._query_cache[key] = (version, [dict(r) for r in results])
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+
     def _embed(self, text: str) -> list[float]:
         # FIX: Add preprocessing to ensure consistent embeddings
-        text = text.strip()  # Only strip whitespace, preserve case for semantic meaning
-        resp = client.embeddings.create(model=EMBED_MODEL, input=text)
-        return resp.data[0].embedding
+        text = normalize_text(text)  # Preserve case for semantic meaning
+        vec = self._cached_embedding(text)
+        if vec is None:
+            resp = client.embeddings.create(
+                model=EMBED_MODEL, input=text, **EMBED_KWARGS
+            )
+            vec = resp.data[0].embedding
+            self._cache_embedding(text, vec)
+        return vec
+
+    def _embed_many(self, texts: list[str]) -> list[list[float]]:
+        texts = [normalize_text(text) for text in texts]
+        vecs = [self._cached_embedding(text) for text in texts]
+
+        # Only texts that missed the cache go to the API
+        misses = [i for i, vec in enumerate(vecs) if vec is None]
+        if misses:
+            resp = client.embeddings.create(
+                model=EMBED_MODEL, input=[texts[i] for i in misses], **EMBED_KWARGS
+            )
+            for d in resp.data:
+                i = misses[d.index]
+                vecs[i] = d.embedding
+                self._cache_embedding(texts[i], d.embedding)
+        return vecs
+
+    async def _embed_async(self, text: str) -> list[float]:
+        text = normalize_text(text)
+        vec = self._cached_embedding(text)
+        if vec is not None:
+            return vec
+
+        future = asyncio.get_running_loop().create_future()
+        self._batcher_queue("embed", self._run_embed_batcher).put_nowait(
+            (text, future)
+        )
+        return await future
+
+    async def _run_embed_batcher(self, queue: asyncio.Queue) -> None:
+        """Drain queued texts into batched embedding requests, resolving each future"""
+        while True:
+            batch = await drain_batch(queue)
+            try:
+                vecs = await self._embed_batch_async([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for vec, (_, future) in zip(vecs, batch):
+                if not future.done():
+                    future.set_result(vec)
+
+    async def _embed_batch_async(self, texts: list[str]) -> list[list[float]]:
+        """Async twin of _embed_many: one API call for every text missing from cache"""
+        texts = [normalize_text(text) for text in texts]
+        vecs = [self._cached_embedding(text) for text in texts]
+
+        misses = [i for i, vec in enumerate(vecs) if vec is None]
+        if misses:
+            resp = await aclient.embeddings.create(
+                model=EMBED_MODEL, input=[texts[i] for i in misses], **EMBED_KWARGS
+            )
+            for d in resp.data:
+                i = misses[d.index]
+                vecs[i] = d.embedding
+                self._cache_embedding(texts[i], d.embedding)
+        return vecs
+
+    def _batcher_queue(self, name: str, run) -> asyncio.Queue:
+        """Queue of the named batcher task, (re)started on the running loop"""
+        loop = asyncio.get_running_loop()
+        queue, task = self._batchers.get(name, (None, None))
+        if task is None or task.done() or task.get_loop() is not loop:
+            queue = asyncio.Queue()
+            task = loop.create_task(run(queue))
+            self._batchers[name] = (queue, task)
+        return queue
+
+    @staticmethod
+    def _embed_cache_key(text: str) -> bytes:
+        key = f"{EMBED_MODEL}\0{EMBED_DIMENSIONS}\0{text}".encode()
+        return hashlib.blake2b(key, digest_size=16).digest()
+
+    def _cached_embedding(self, text: str) -> list[float] | None:
+        key = self._embed_cache_key(text)
+        with self._embed_cache_lock:
+            packed = self._embed_cache.get(key)
+            if packed is None:
+                return None
+            self._embed_cache.move_to_end(key)
+        return packed.tolist()
+
+    def _cache_embedding(self, text: str, vec: list[float]) -> None:
+        key = self._embed_cache_key(text)
+        packed = array("f", vec)
+        with self._embed_cache_lock:
+            self._embed_cache[key] = packed
+            self._embed_cache.move_to_end(key)
+            while len(self._embed_cache) > EMBED_CACHE_SIZE:
+                self._embed_cache.popitem(last=False)
 
 
 # ────────────────────────────────────
@@ -263,11 +915,27 @@ def create_test_memory_store() -> MemoryStore:
     return MemoryStore(test_mode=True)
 
 
-# instantiate - use explicit production factory
-memory = create_production_memory_store()
-print(f"🧠 Dev server using memory database at: {memory.db_path}")
-print(f"🧠 Test mode: {memory.is_test_env}")
-print(f"🧠 Collection: {memory.collection_name}")
+# The server's store is opened on first use (or by the lifespan warm-up)
+# rather than at import; `dev_server.memory` still resolves to it.
+_memory_lock = threading.Lock()
+
+
+def get_memory() -> MemoryStore:
+    with _memory_lock:
+        if "memory" not in globals():
+            # use explicit production factory
+            memory = create_production_memory_store()
+            log.info("🧠 Dev server using memory database at: %s", memory.db_path)
+            log.info("🧠 Test mode: %s", memory.is_test_env)
+            log.info("🧠 Collection: %s", memory.collection_name)
+            globals()["memory"] = memory
+    return globals()["memory"]
+
+
+def __getattr__(name):
+    if name == "memory":
+        return get_memory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ────────────────────────────────────
@@ -295,16 +963,18 @@ async def save_memory(note_content: str) -> str:
     • Include one or two key phrases for future semantic hits.
     • Write in the third person for clarity ("User admits…", "We decide…").
 
-    Returns a confirmation preview of the stored text.
+    Returns a preview of the text queued for saving. The write finishes in
+    the background; a failure is logged by the server, not reported here.
     """
-    # FIX: Use async to avoid blocking
-    idx = await asyncio.to_thread(memory.add, note_content)
+    # The preview doesn't depend on the write, so return without waiting for
+    # the embedding and Chroma write; queries flush pending saves first
+    get_memory().add_in_background(note_content)
 
     # Return a preview instead of just an index
     return (
-        f"Memory saved: '{note_content[:50]}...'"
+        f"Memory queued for saving: '{note_content[:50]}...'"
         if len(note_content) > 50
-        else f"Memory saved: '{note_content}'"
+        else f"Memory queued for saving: '{note_content}'"
     )
 
 
@@ -326,13 +996,15 @@ async def query_memory(query: str, k: int = 5) -> list[dict]:
     current mood or topic. Keep k small (≤5) to limit context size.
     """
     try:
-        if memory.col.count() == 0:
+        memory = get_memory()
+        await memory.flush()
+        if memory.count() == 0:
             return [
                 {"text": "No memories stored yet", "relevance": 0.0, "saved_at": ""}
             ]
 
         # FIX: Use the enhanced query method
-        results = await asyncio.to_thread(memory.query, query, k)
+        results = await memory.query_async(query, k)
 
         if not results:
             return [
@@ -344,11 +1016,16 @@ async def query_memory(query: str, k: int = 5) -> list[dict]:
             ]
 
         # Log for debugging
-        print(f"✓ Query '{query}' found {len(results)} memories")
-        for i, r in enumerate(results[:3]):  # Show top 3
-            print(
-                f"   {i+1}. {r['text'][:50]}... (similarity: {r['relevance']:.3f}, distance: {r.get('distance', 'N/A'):.3f})"
-            )
+        log.debug("✓ Query '%s' found %s memories", query, len(results))
+        if log.isEnabledFor(logging.DEBUG):
+            for i, r in enumerate(results[:3]):  # Show top 3
+                log.debug(
+                    "   %s. %s... (similarity: %.3f, distance: %.3f)",
+                    i + 1,
+                    r["text"][:50],
+                    r["relevance"],
+                    r.get("distance", "N/A"),
+                )
 
         # Remove distance field from results
         for r in results:
@@ -357,7 +1034,7 @@ async def query_memory(query: str, k: int = 5) -> list[dict]:
         return results
 
     except Exception as e:
-        print(f"✗ Error querying memory: {e}")
+        log.error("✗ Error querying memory: %s", e)
         return [
             {"text": f"Memory query failed: {str(e)}", "relevance": 0.0, "saved_at": ""}
         ]
@@ -403,11 +1080,11 @@ async def web_search(
         "safesearch": "moderate",
     }
 
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as sess:
-        async with sess.get(url, headers=headers, params=params) as resp:
-            if resp.status != 200:
-                raise RuntimeError(f"Brave API {resp.status}: {await resp.text()}")
-            data = await resp.json()
+    sess = get_brave_session()
+    async with sess.get(url, headers=headers, params=params) as resp:
+        if resp.status != 200:
+            raise RuntimeError(f"Brave API {resp.status}: {await resp.text()}")
+        data = orjson.loads(await resp.read())
 
     return [
         {
@@ -424,9 +1101,8 @@ async def web_search(
 # ────────────────────────────────────
 
 
-def create_dream_system_prompt(synthesis_depth: str = "deep") -> str:
-    """Create specialized system prompt for dream synthesis"""
-    base_prompt = """You are a memory synthesis engine that creates meaningful connections across stored memories.
+# Dream prompts don't depend on the memories, so they're built once per depth
+DREAM_BASE_PROMPT = """You are a memory synthesis engine that creates meaningful connections across stored memories.
 
 Your role is to:
 - Analyze patterns and hidden connections between disparate memories
@@ -444,15 +1120,41 @@ Synthesis depth: {synthesis_depth}
 Maximum length: 350 tokens (strictly enforced)
 Style: Flowing narrative that transforms memory fragments into psychological insight"""
 
-    depth_instructions = {
-        "surface": "Focus on obvious connections and immediate emotional themes.",
-        "deep": "Explore complex psychological patterns and unconscious connections.", 
-        "poetic": "Emphasize metaphorical language and symbolic connections.",
-        "analytical": "Prioritize pattern recognition and psychological analysis."
-    }
-    
-    instruction = depth_instructions.get(synthesis_depth, depth_instructions["deep"])
-    return base_prompt.format(synthesis_depth=synthesis_depth) + f"\n\nSpecific approach: {instruction}"
+DREAM_DEPTH_INSTRUCTIONS = {
+    "surface": "Focus on obvious connections and immediate emotional themes.",
+    "deep": "Explore complex psychological patterns and unconscious connections.",
+    "poetic": "Emphasize metaphorical language and symbolic connections.",
+    "analytical": "Prioritize pattern recognition and psychological analysis."
+}
+
+DREAM_SYSTEM_PROMPTS = {
+    depth: DREAM_BASE_PROMPT.format(synthesis_depth=depth)
+    + f"\n\nSpecific approach: {instruction}"
+    for depth, instruction in DREAM_DEPTH_INSTRUCTIONS.items()
+}
+
+
+def create_dream_system_prompt(synthesis_depth: str = "deep") -> str:
+    """Create specialized system prompt for dream synthesis"""
+    prompt = DREAM_SYSTEM_PROMPTS.get(synthesis_depth)
+    if prompt is None:
+        # Unknown depths keep their label but get the "deep" approach
+        prompt = DREAM_BASE_PROMPT.format(synthesis_depth=synthesis_depth) + (
+            f"\n\nSpecific approach: {DREAM_DEPTH_INSTRUCTIONS['deep']}"
+        )
+    return prompt
+
+
+def merge_memory_results(result_lists: list[list[dict]], k: int) -> list[dict]:
+    """Merge results from several cues, keeping each memory's best match"""
+    best = {}
+    for results in result_lists:
+        for memory in results:
+            seen = best.get(memory["text"])
+            if seen is None or memory["relevance"] > seen["relevance"]:
+                best[memory["text"]] = memory
+    merged = sorted(best.values(), key=lambda m: m["relevance"], reverse=True)
+    return merged[:k]
 
 
 def format_memories_for_synthesis(memories: list[dict], theme: str = None) -> str:
@@ -484,26 +1186,27 @@ def validate_dream_output(content: str) -> str:
     # Enforce token limit using tiktoken
     max_tokens = int(os.getenv("DREAM_MAX_TOKENS", "350"))
     
+    # Every token covers at least one UTF-8 byte, so short outputs can't be
+    # over the limit and don't need tokenizing
+    if len(content.encode("utf-8")) <= max_tokens:
+        return content.strip()
+
     try:
         # Use the same encoding as the embedding model
-        tokens = enc.encode(content)
+        tokens = get_encoding().encode(content)
         
         if len(tokens) > max_tokens:
             # Truncate to max tokens and decode back
             truncated_tokens = tokens[:max_tokens]
-            content = enc.decode(truncated_tokens)
-            
-            # Clean up any incomplete sentences at the end
-            sentences = content.split('.')
-            if len(sentences) > 1 and not sentences[-1].strip():
-                sentences = sentences[:-1]  # Remove empty last sentence
-            elif len(sentences) > 1:
-                sentences = sentences[:-1]  # Remove potentially incomplete last sentence
+            content = get_encoding().decode(truncated_tokens)
             
-            content = '.'.join(sentences) + '.'
+            # Clean up any incomplete sentence at the end by cutting back to the
+            # last full stop (one split from the right instead of splitting
+            # every sentence and joining them back)
+            content = content.rsplit('.', 1)[0] + '.'
             
     except Exception as e:
-        print(f"⚠ Token validation error: {e}")
+        log.warning("⚠ Token validation error: %s", e)
     
     return content.strip()
 
@@ -534,7 +1237,12 @@ async def dream(theme: str = None, synthesis_depth: str = "deep") -> str:
         query_text = theme if theme else "emotional patterns"
         memory_count = int(os.getenv("DREAM_MEMORY_COUNT", "8"))
         
-        memories = await asyncio.to_thread(memory.query, query_text, k=memory_count)
+        # Search a few variants of the theme; their embeddings go out in one
+        # batch and Chroma answers them in one multi-vector query
+        cues = [query_text, f"{query_text} feelings", f"{query_text} memories"]
+        memories = merge_memory_results(
+            await get_memory().query_many(cues, k=memory_count), memory_count
+        )
         
         if not memories:
             return "No memories stored yet. The dreaming mind awaits first impressions to weave into synthesis."
@@ -551,8 +1259,7 @@ async def dream(theme: str = None, synthesis_depth: str = "deep") -> str:
         temperature = float(os.getenv("DREAM_TEMPERATURE", "0.8"))  # Higher creativity
         max_tokens = int(os.getenv("DREAM_MAX_TOKENS", "350"))
         
-        response = await asyncio.to_thread(
-            client.chat.completions.create,
+        response = await aclient.chat.completions.create(
             model=dream_model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -567,26 +1274,32 @@ async def dream(theme: str = None, synthesis_depth: str = "deep") -> str:
         validated_output = validate_dream_output(synthesis)
         
         # Log the synthesis for debugging
-        print(f"✨ Dream synthesis generated (theme: {theme or 'general'}, depth: {synthesis_depth})")
-        print(f"   Memories processed: {len(memories)}")
-        print(f"   Output tokens: ~{len(enc.encode(validated_output))}")
+        if log.isEnabledFor(logging.INFO):
+            log.info("✨ Dream synthesis generated (theme: %s, depth: %s)", theme or 'general', synthesis_depth)
+            log.info("   Memories processed: %s", len(memories))
+            # The API already counted the completion; only re-tokenize if it
+            # was truncated
+            if validated_output == synthesis and response.usage:
+                output_tokens = response.usage.completion_tokens
+            else:
+                output_tokens = len(get_encoding().encode(validated_output))
+            log.info("   Output tokens: ~%s", output_tokens)
         
         return validated_output
         
     except Exception as e:
-        print(f"✗ Error generating dream synthesis: {e}")
-        import traceback
-        traceback.print_exc()
+        log.error(
+            "✗ Error generating dream synthesis: %s",
+            e,
+            exc_info=log.isEnabledFor(logging.DEBUG),
+        )
         
         # Fallback response that maintains the dream aesthetic
         return f"The synthesis chamber encounters turbulence. Memory threads remain tangled. (Error: {str(e)[:100]})"
 
 
-def create_reflection_system_prompt(depth: int, topic: str = None) -> str:
-    """Create specialized system prompt for emotional reflection at specific depth"""
-    
-    depth_prompts = {
-        1: """You are generating a first-level emotional reflection. Focus on:
+REFLECTION_DEPTH_PROMPTS = {
+    1: """You are generating a first-level emotional reflection. Focus on:
 - Immediate emotional recognition and awareness
 - Surface-level pattern identification
 - Present moment feelings and reactions
@@ -597,7 +1310,7 @@ Speak in first person as if these are your own emotions and memories.
 Maintain intimate, personal language. Avoid clinical or therapeutic terminology.
 Keep reflection grounded in the specific memories provided.""",
 
-        2: """You are generating a second-level emotional reflection. Go deeper:
+    2: """You are generating a second-level emotional reflection. Go deeper:
 - Connect current emotions to past patterns and experiences
 - Analyze underlying causes and historical connections
 - Explore recurring themes and their origins
@@ -608,7 +1321,7 @@ Build on first-level awareness to find deeper connections and insights.
 Speak intimately about emotional patterns and their development over time.
 Use memory context to trace emotional evolution.""",
 
-        3: """You are generating a third-level meta-cognitive reflection. Explore:
+    3: """You are generating a third-level meta-cognitive reflection. Explore:
 - Awareness of your awareness - how your understanding itself is changing
 - The recursive nature of emotional insight and growth
 - How reflection itself transforms your relationship to emotions
@@ -618,9 +1331,12 @@ Use memory context to trace emotional evolution.""",
 This is the deepest level - focus on the transformation that comes from insight itself.
 Speak about the recursive nature of self-understanding and emotional evolution.
 Maximum depth reached - no further recursion possible."""
-    }
-    
-    base_instruction = depth_prompts.get(depth, depth_prompts[1])
+}
+
+
+def create_reflection_system_prompt(depth: int, topic: str = None) -> str:
+    """Create specialized system prompt for emotional reflection at specific depth"""
+    base_instruction = REFLECTION_DEPTH_PROMPTS.get(depth, REFLECTION_DEPTH_PROMPTS[1])
     
     topic_focus = f"\nSpecific focus area: {topic}" if topic else "\nGeneral emotional reflection across all memories."
     
@@ -638,14 +1354,14 @@ def validate_reflection_depth(depth: int) -> int:
         try:
             depth = int(depth)
         except (ValueError, TypeError):
-            print(f"⚠ Invalid depth type: {type(depth)}, defaulting to 1")
+            log.warning("⚠ Invalid depth type: %s, defaulting to 1", type(depth))
             return 1
     
     if depth < 1:
-        print(f"⚠ Depth {depth} too low, setting to minimum: 1")
+        log.warning("⚠ Depth %s too low, setting to minimum: 1", depth)
         return 1
     elif depth > 3:
-        print(f"⚠ Depth {depth} exceeds maximum, capping at: 3")
+        log.warning("⚠ Depth %s exceeds maximum, capping at: 3", depth)
         return 3
     
     return depth
@@ -702,16 +1418,16 @@ async def reflect(topic: str = None, depth: int = 1) -> str:
         depth = validate_reflection_depth(depth)
         
         if depth != original_depth:
-            print(f"🛡️ Depth enforcement: {original_depth} → {depth}")
+            log.info("🛡️ Depth enforcement: %s → %s", original_depth, depth)
         
         # Log reflection request for debugging
-        print(f"🤔 Reflection requested: topic='{topic or 'general'}', depth={depth}/3")
+        log.info("🤔 Reflection requested: topic='%s', depth=%s/3", topic or 'general', depth)
         
         # Query memories for reflection context
         query_text = topic if topic else "emotional patterns recurring themes"
         memory_count = min(8, max(3, depth * 2))  # Scale memory context with depth
         
-        memories = await asyncio.to_thread(memory.query, query_text, k=memory_count)
+        memories = await get_memory().query_async(query_text, k=memory_count)
         
         # Create depth-appropriate system prompt
         system_prompt = create_reflection_system_prompt(depth, topic)
@@ -724,8 +1440,7 @@ async def reflect(topic: str = None, depth: int = 1) -> str:
         temperature = float(os.getenv("REFLECT_TEMPERATURE", "0.7"))  # Balanced creativity/coherence
         max_tokens = min(800, 200 + (depth * 150))  # Scale output length with depth
         
-        response = await asyncio.to_thread(
-            client.chat.completions.create,
+        response = await aclient.chat.completions.create(
             model=reflection_model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -745,14 +1460,26 @@ async def reflect(topic: str = None, depth: int = 1) -> str:
         final_output = reflection_output + depth_indicator
         
         # Log successful reflection
-        print(f"✓ Reflection generated: {len(memories)} memories, {len(enc.encode(reflection_output))} tokens, depth {depth}/3")
+        if log.isEnabledFor(logging.INFO):
+            log.info(
+                "✓ Reflection generated: %s memories, %s tokens, depth %s/3",
+                len(memories),
+                (
+                    response.usage.completion_tokens
+                    if response.usage
+                    else len(get_encoding().encode(reflection_output))
+                ),
+                depth,
+            )
         
         return final_output
         
     except Exception as e:
-        print(f"✗ Error generating reflection: {e}")
-        import traceback
-        traceback.print_exc()
+        log.error(
+            "✗ Error generating reflection: %s",
+            e,
+            exc_info=log.isEnabledFor(logging.DEBUG),
+        )
         
         # Fallback that maintains depth awareness
         safe_depth = validate_reflection_depth(depth) if 'depth' in locals() else 1
@@ -765,7 +1492,7 @@ async def reflect(topic: str = None, depth: int = 1) -> str:
 if __name__ == "__main__":
     import sys
 
-    print("🧪 Starting DEVELOPMENT server with enhanced tools...")
+    log.info("🧪 Starting DEVELOPMENT server with enhanced tools...")
 
     # Check if running with SSE flag
     if "--sse" in sys.argv or os.getenv("MCP_TRANSPORT") == "sse":
@@ -773,12 +1500,14 @@ if __name__ == "__main__":
         host = os.getenv("MCP_HOST", "0.0.0.0")
         port = int(os.getenv("MCP_PORT", "8000"))
 
-        print(f"Starting dev server with SSE transport on {host}:{port}")
-        print(f"SSE endpoint will be: http://{host}:{port}/sse")
+        log.info("Starting dev server with SSE transport on %s:%s", host, port)
+        log.info("SSE endpoint will be: http://%s:%s/sse", host, port)
 
         # Run with SSE transport
         mcp.run(transport="sse", host=host, port=port)
     else:
         # Default: Run as STDIO server
-        print("Starting dev server with STDIO transport")
+        log.info("Starting dev server with STDIO transport")
+        # Keep the client's terminal quiet unless something goes wrong
+        log.setLevel(os.getenv("LOG_LEVEL", "WARNING").upper())
         mcp.run()
@@ -4,22 +4,35 @@ original client with added SSE support for remote deployment.
 Run with --sse flag to use SSE transport instead of STDIO.
 """
 
-import asyncio, json, os, sys
+import asyncio, os, sys
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List
 
-from dotenv import load_dotenv
-from openai import OpenAI
 from rich import print
-from rich.console import Console
 
 # MCP SDK imports
-from mcp.client.stdio import stdio_client
-from mcp.client.sse import sse_client
+# Transport clients are imported by the entry point that uses them, so a
+# session only loads the transport it runs on
 from mcp import ClientSession, StdioServerParameters
 
-# Load environment variables
-load_dotenv()
+# OpenAI connection and helpers shared by the chat clients
+from client_common import (
+    OA_BASE_URL,
+    OA_KEY,
+    STREAM,
+    StreamedReply,
+    collect_stream,
+    extract_tool_text,
+    mcp_tool_to_openai,
+    oa_client,
+    parse_tool_args,
+    prompt_cache_params,
+    read_user_input,
+    reject_tool_call,
+    schedule_trim,
+    tool_calls_of,
+    tool_params,
+)
 
 # OpenAI Configuration
 SYSTEM_PROMPT = """
@@ -148,84 +161,124 @@ OUTPUT FORMAT (always):
 <free-form reply in 1-3 vivid sentences>  
 <ONE gentle question>"""
 
-MODEL = "gpt-4.1"
-console = Console()
+# Shared, never mutated - every conversation starts from this same message
+SYSTEM_MSG: Dict[str, Any] = {"role": "system", "content": SYSTEM_PROMPT}
 
-OA_BASE_URL = os.getenv("OPENAI_BASE_URL")
-OA_KEY = os.getenv("OPENAI_API_KEY", "local-key")
-STREAM = os.getenv("STREAM", "").lower() == "true"
+MODEL = "gpt-4.1"
 
-oa_client = OpenAI(api_key=OA_KEY, base_url=OA_BASE_URL if OA_BASE_URL else None)
+# Keeps requests on OpenAI servers holding this client's cached system prompt
+PROMPT_CACHE_PARAMS = prompt_cache_params("closer-hybrid")
 
 
-# Helper functions (unchanged from original)
-def mcp_tool_to_openai(tool) -> Dict[str, Any]:
-    schema = (
-        tool.inputSchema.__dict__
-        if hasattr(tool.inputSchema, "__dict__")
-        else tool.inputSchema
-    )
-    return {
-        "type": "function",
-        "function": {
-            "name": tool.name,
-            "description": tool.description or "",
-            "parameters": schema,
-        },
-    }
-
-
-def tool_calls_of(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
-    return msg.get("tool_calls")
-
-
-def extract_tool_text(jawbone) -> str:
-    if not jawbone or not jawbone.content:
-        return ""
-    for part in jawbone.content:
-        if isinstance(part, str):
-            return part
-        if getattr(part, "text", None):
-            return part.text
-        if isinstance(part, dict) and "text" in part:
-            return part["text"]
-    return ""
-
-
-async def call_openai(msgs, tools, use_stream=False) -> Dict[str, Any]:
+async def call_openai(
+    msgs, tools, use_stream=False, on_delta: Callable[[str], None] | None = None
+) -> Dict[str, Any]:
+    """Request a completion; when streaming, on_delta receives each text fragment."""
     if use_stream:
-        stream = oa_client.chat.completions.create(
+        stream = await oa_client.chat.completions.create(
             model=MODEL,
+            **PROMPT_CACHE_PARAMS,
             messages=msgs,
-            tools=tools,
-            tool_choice="auto",
+            **tool_params(tools, "auto"),
             stream=True,
         )
-        merged = {"role": "assistant", "content": "", "tool_calls": []}
-        for chunk in stream:
-            delta = chunk.choices[0].delta
-            merged["content"] += delta.content or ""
-            if delta.tool_calls:
-                merged["tool_calls"].extend(
-                    tc.model_dump() if hasattr(tc, "model_dump") else tc
-                    for tc in delta.tool_calls
-                )
-        if not merged["tool_calls"]:
-            merged.pop("tool_calls")
-        return merged
+        return await collect_stream(stream, on_delta)
     else:
-        resp = oa_client.chat.completions.create(
+        resp = await oa_client.chat.completions.create(
             model=MODEL,
+            **PROMPT_CACHE_PARAMS,
             messages=msgs,
-            tools=tools,
-            tool_choice="auto",
+            **tool_params(tools, "auto"),
             stream=False,
         )
         return resp.choices[0].message.model_dump()
 
 
+async def _run_session(session: ClientSession, connected_label: str):
+    """Run the conversation loop over an open MCP session (any transport)."""
+    await session.initialize()
+
+    tool_list = (await session.list_tools()).tools
+    if not tool_list:
+        print("[red]❌  No tools exposed by server.[/red]")
+        return
+
+    oa_tools = [mcp_tool_to_openai(t) for t in tool_list]
+    print(
+        f"[green]{connected_label}. Tools:[/green]",
+        ", ".join(t["function"]["name"] for t in oa_tools),
+    )
+
+    messages: List[Dict[str, Any]] = [SYSTEM_MSG]
+
+    # Main conversation loop
+    while True:
+        user_msg = await read_user_input("[bold cyan]You:[/bold cyan] ")
+        if user_msg.lower() in {"quit", "exit"}:
+            break
+
+        messages.append({"role": "user", "content": user_msg})
+        resp_msg = await call_openai(messages, oa_tools, use_stream=STREAM)
+
+        if tool_calls_of(resp_msg):
+            messages.append(resp_msg)
+
+            calls = []
+            for call in resp_msg["tool_calls"]:
+                fn_name = call["function"]["name"]
+                fn_args = parse_tool_args(call)
+                print(f"[grey]→ calling {fn_name}{fn_args}[/grey]")
+                calls.append((call, fn_name, fn_args))
+
+            # Independent tool calls run concurrently over the session
+            jaws = await asyncio.gather(
+                *(
+                    session.call_tool(name, args)
+                    if args is not None
+                    else reject_tool_call()
+                    for _, name, args in calls
+                ),
+                return_exceptions=True,
+            )
+
+            # Record results in the original call order
+            for (call, fn_name, _), jaw in zip(calls, jaws):
+                if isinstance(jaw, Exception):
+                    tool_result = f"Tool {fn_name} failed: {jaw}"
+                else:
+                    tool_result = extract_tool_text(jaw)
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": call["id"],
+                        "content": tool_result,
+                    }
+                )
+
+            # When streaming, the reply is printed token by token as it arrives
+            reply = StreamedReply() if STREAM else None
+            try:
+                final_msg = await call_openai(
+                    messages, [], use_stream=STREAM, on_delta=reply
+                )
+            finally:
+                streamed = reply.close() if reply else False
+            messages.append(final_msg)
+            if not streamed:
+                print(f"[bold magenta]Closer:[/bold magenta] {final_msg['content']}")
+        else:
+            messages.append(resp_msg)
+            print(f"[bold magenta]Closer:[/bold magenta] {resp_msg['content']}")
+
+        # Fold older turns into a summary in the background once the history
+        # outgrows its budget, so requests stay roughly constant in size
+        schedule_trim(messages)
+
+
 async def run_chat_client_sse():
     """SSE version of the chat client."""
+    from mcp.client.sse import sse_client
+
     sse_url = os.getenv("SSE_URL", "http://localhost:8000/sse")
     api_key = os.getenv("API_KEY")
 
@@ -237,61 +290,13 @@ async def run_chat_client_sse():
 
     async with sse_client(sse_url, headers=headers) as (read, write):
         async with ClientSession(read, write) as session:
-            await session.initialize()
-
-            tool_list = (await session.list_tools()).tools
-            if not tool_list:
-                print("[red]❌  No tools exposed by server.[/red]")
-                return
-
-            oa_tools = [mcp_tool_to_openai(t) for t in tool_list]
-            print(
-                f"[green]Connected via SSE (Remote). Tools:[/green]",
-                ", ".join(t["function"]["name"] for t in oa_tools),
-            )
-
-            messages: List[Dict[str, Any]] = [
-                {"role": "system", "content": f"""{SYSTEM_PROMPT}"""},
-            ]
-
-            # Main conversation loop
-            while True:
-                user_msg = console.input("[bold cyan]You:[/bold cyan] ")
-                if user_msg.lower() in {"quit", "exit"}:
-                    break
-
-                messages.append({"role": "user", "content": user_msg})
-                resp_msg = await call_openai(messages, oa_tools, use_stream=STREAM)
-
-                if tool_calls_of(resp_msg):
-                    messages.append(resp_msg)
-
-                    for call in resp_msg["tool_calls"]:
-                        fn_name = call["function"]["name"]
-                        fn_args = json.loads(call["function"].get("arguments", "{}"))
-                        print(f"[grey]→ calling {fn_name}{fn_args}[/grey]")
-
-                        jaw = await session.call_tool(fn_name, fn_args)
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": call["id"],
-                                "content": extract_tool_text(jaw),
-                            }
-                        )
-
-                    final_msg = await call_openai(messages, [], use_stream=STREAM)
-                    messages.append(final_msg)
-                    print(
-                        f"[bold magenta]Closer:[/bold magenta] {final_msg['content']}"
-                    )
-                else:
-                    messages.append(resp_msg)
-                    print(f"[bold magenta]Closer:[/bold magenta] {resp_msg['content']}")
+            await _run_session(session, "Connected via SSE (Remote)")
 
 
 async def run_chat_client():
-    """Original STDIO version - unchanged from original."""
+    """STDIO version of the chat client."""
+    from mcp.client.stdio import stdio_client
+
     server_params = StdioServerParameters(
         command="python3",
         args=[str(Path(__file__).with_name("server.py"))],
@@ -300,57 +305,7 @@ async def run_chat_client():
 
     async with stdio_client(server_params) as (read, write):
         async with ClientSession(read, write) as session:
-            await session.initialize()
-
-            tool_list = (await session.list_tools()).tools
-            if not tool_list:
-                print("[red]❌  No tools exposed by server.[/red]")
-                return
-
-            oa_tools = [mcp_tool_to_openai(t) for t in tool_list]
-            print(
-                "[green]Connected. Tools:[/green]",
-                ", ".join(t["function"]["name"] for t in oa_tools),
-            )
-
-            # Keep your original message handling code exactly as is
-            messages: List[Dict[str, Any]] = [
-                {"role": "system", "content": f"""{SYSTEM_PROMPT}"""},
-            ]
-
-            while True:
-                user_msg = console.input("[bold cyan]You:[/bold cyan] ")
-                if user_msg.lower() in {"quit", "exit"}:
-                    break
-
-                messages.append({"role": "user", "content": user_msg})
-                resp_msg = await call_openai(messages, oa_tools, use_stream=STREAM)
-
-                if tool_calls_of(resp_msg):
-                    messages.append(resp_msg)
-
-                    for call in resp_msg["tool_calls"]:
-                        fn_name = call["function"]["name"]
-                        fn_args = json.loads(call["function"].get("arguments", "{}"))
-                        print(f"[grey]→ calling {fn_name}{fn_args}[/grey]")
-
-                        jaw = await session.call_tool(fn_name, fn_args)
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": call["id"],
-                                "content": extract_tool_text(jaw),
-                            }
-                        )
-
-                    final_msg = await call_openai(messages, [], use_stream=STREAM)
-                    messages.append(final_msg)
-                    print(
-                        f"[bold magenta]Closer:[/bold magenta] {final_msg['content']}"
-                    )
-                else:
-                    messages.append(resp_msg)
-                    print(f"[bold magenta]Closer:[/bold magenta] {resp_msg['content']}")
+            await _run_session(session, "Connected")
 
 
 if __name__ == "__main__":
@@ -361,10 +316,18 @@ if __name__ == "__main__":
     # Check for --sse flag
     use_sse = "--sse" in sys.argv
 
+    # uvloop's libuv event loop when installed (it isn't available on Windows)
+    try:
+        import uvloop
+    except ImportError:
+        run = asyncio.run
+    else:
+        run = uvloop.run
+
     try:
         if use_sse:
-            asyncio.run(run_chat_client_sse())
+            run(run_chat_client_sse())
         else:
-            asyncio.run(run_chat_client())
+            run(run_chat_client())
     except KeyboardInterrupt:
         pass
@@ -8,7 +8,7 @@ import os
 import asyncio
 from pathlib import Path
 import sys
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 # Add current directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
@@ -32,7 +32,7 @@ def create_mock_openai_response(content: str):
 @pytest.fixture
 def mock_openai_api():
     """Fixture to mock all OpenAI API calls for integration tests"""
-    with patch('dev_server.client.chat.completions.create') as mock_create:
+    with patch('dev_server.aclient.chat.completions.create', new_callable=AsyncMock) as mock_create:
         # Default response for any unmocked calls
         default_response = (
             "This is a thoughtful synthesis of memories and patterns, exploring the deep "
@@ -92,7 +92,7 @@ async def test_dream_full_integration(dev_mcp_tools, rich_memory_store):
     
     # Patch the memory store in dev_server to use our rich memory store
     with patch('dev_server.memory', rich_memory_store), \
-         patch('dev_server.client.chat.completions.create') as mock_create:
+         patch('dev_server.aclient.chat.completions.create', new_callable=AsyncMock) as mock_create:
         mock_create.return_value = create_mock_openai_response(mock_content)
         
         # Test dream synthesis with theme
@@ -138,7 +138,7 @@ async def test_dream_token_enforcement(dev_mcp_tools, rich_memory_store):
     # Create a long mock response that should be truncated
     long_mock_content = "This is a very long dream synthesis response with many words and detailed content that should definitely exceed the token limit. " * 20  # Should exceed 350 tokens
     
-    with patch('dev_server.client.chat.completions.create') as mock_create:
+    with patch('dev_server.aclient.chat.completions.create', new_callable=AsyncMock) as mock_create:
         mock_create.return_value = create_mock_openai_response(long_mock_content)
         
         # Generate dream synthesis
@@ -179,7 +179,7 @@ async def test_dream_synthesis_depths(dev_mcp_tools, rich_memory_store):
     
     for depth in depths:
         with patch('dev_server.memory', rich_memory_store), \
-             patch('dev_server.client.chat.completions.create') as mock_create:
+             patch('dev_server.aclient.chat.completions.create', new_callable=AsyncMock) as mock_create:
             mock_create.return_value = create_mock_openai_response(depth_responses[depth])
             result = await dream_func(theme="relationships", synthesis_depth=depth)
             results[depth] = result
@@ -227,7 +227,7 @@ async def test_reflect_depth_progression(dev_mcp_tools, rich_memory_store):
         3: "What strikes me is that I can see this pattern so clearly now. The very act of recognizing my fear is changing my relationship to it - I am not just the fearful child anymore, but also the observer who understands."
     }
     
-    with patch('dev_server.client.chat.completions.create') as mock_create:
+    with patch('dev_server.aclient.chat.completions.create', new_callable=AsyncMock) as mock_create:
         for depth in [1, 2, 3]:
             mock_create.return_value = create_mock_openai_response(reflection_responses[depth])
             result = await reflect_func(topic=topic, depth=depth)
@@ -261,7 +261,7 @@ async def test_reflect_depth_limiting_enforcement(dev_mcp_tools, rich_memory_sto
     # Mock response for depth enforcement testing
     mock_response = "I'm examining my growth patterns and how they evolve over time."
     
-    with patch('dev_server.client.chat.completions.create') as mock_create:
+    with patch('dev_server.aclient.chat.completions.create', new_callable=AsyncMock) as mock_create:
         mock_create.return_value = create_mock_openai_response(mock_response)
         
         # Test valid depths work
@@ -407,6 +407,28 @@ async def test_memory_system_integration(dev_mcp_tools, rich_memory_store, mock_
         dev_mcp_tools['memory'] = original_memory
 
 
+@pytest.mark.integration
+@pytest.mark.dream
+def test_merge_memory_results_keeps_best_match():
+    """Memories found by several dream cues appear once, at their best relevance"""
+    from dev_server import merge_memory_results
+
+    def hit(text, relevance):
+        return {"text": text, "relevance": relevance}
+
+    merged = merge_memory_results(
+        [
+            [hit("fear of the dark", 0.6), hit("first day of school", 0.5)],
+            [hit("fear of the dark", 0.9), hit("lost in a forest", 0.4)],
+            [hit("first day of school", 0.3)],
+        ],
+        k=2,
+    )
+
+    assert [m["text"] for m in merged] == ["fear of the dark", "first day of school"]
+    assert merged[0]["relevance"] == 0.9
+
+
 # ────────────────────────────────────
 # ERROR HANDLING INTEGRATION TESTS
 # ────────────────────────────────────
@@ -3,6 +3,7 @@
 Pytest version of core memory functionality tests
 Combines best parts of test_memory.py and test_deep_analysis.py
 """
+import asyncio
 import pytest
 from pathlib import Path
 
@@ -77,7 +78,7 @@ def test_case_preservation_in_search(sample_test_memory):
 
 
 @pytest.mark.core 
-def test_high_quality_semantic_search(sample_test_memory):
+async def test_high_quality_semantic_search(sample_test_memory):
     """Test that semantic search achieves high relevance scores (from test_deep_analysis.py)"""
     memory = sample_test_memory
     
@@ -88,8 +89,9 @@ def test_high_quality_semantic_search(sample_test_memory):
         "confesses killed man M14 rifle"  # High overlap
     ]
     
-    for query in high_overlap_queries:
-        results = memory.query(query, k=1)
+    # One batched embedding request and one Chroma query for the whole sweep
+    batched = await memory.query_many(high_overlap_queries, k=1)
+    for query, results in zip(high_overlap_queries, batched):
         assert len(results) > 0, f"Should find results for query: {query}"
         
         # Expect good to excellent relevance scores
@@ -126,7 +128,7 @@ def test_database_files_exist(clean_test_memory):
     files = list(memory.db_path.iterdir())
     file_names = [f.name for f in files]
     
-    assert "id_map.json" in file_names, "Should have id_map.json file"
+    assert "id_map.log" in file_names, "Should have id_map.log file"
     assert "chroma.sqlite3" in file_names, "Should have ChromaDB SQLite file"
 
 
@@ -172,4 +174,320 @@ def test_memory_index_mapping(clean_test_memory):
     
     # Verify we can retrieve both
     assert memory.get(idx1) == "First memory"
-    assert memory.get(idx2) == "Second memory" 
\ No newline at end of file
+    assert memory.get(idx2) == "Second memory" 
+
+@pytest.mark.core
+def test_memory_add_many(clean_test_memory):
+    """Test that batched additions get sequential indices and are retrievable"""
+    memory = clean_test_memory
+
+    texts = ["Batched memory one", "Batched memory two", "Batched memory three"]
+    indices = memory.add_many(texts)
+
+    assert indices == [0, 1, 2], "Batched memories should get sequential indices"
+    assert memory.col.count() == 3, "All batched memories should be stored"
+    for idx, text in zip(indices, texts):
+        assert memory.get(idx) == text, "Batched memory should be retrievable"
+
+
+@pytest.mark.core
+def test_memory_reset(sample_test_memory):
+    """Test that reset empties the store in place"""
+    memory = sample_test_memory
+    db_path = memory.db_path
+
+    memory.reset()
+
+    assert memory.col.count() == 0, "Collection should be empty after reset"
+    assert memory.id_map == {}, "Index map should be empty after reset"
+    assert memory.next_index == 0, "Indices should restart from zero"
+    assert memory.db_path == db_path, "Reset should keep the same database path"
+
+
+@pytest.mark.core
+def test_embedding_cache(clean_test_memory):
+    """Test that repeated text is served from the embedding cache"""
+    memory = clean_test_memory
+
+    first = memory._embed("sapphire")
+    cached = len(memory._embed_cache)
+    second = memory._embed("  sapphire  ")
+    assert len(memory._embed_cache) == cached, "Repeated text should hit the cache"
+    assert second == pytest.approx(first, abs=1e-6), "Cache should keep the vector"
+
+    batch = memory._embed_many(["sapphire", "emerald"])
+    assert batch[0] == second, "Batch embedding should reuse cached vectors"
+    assert len(batch[1]) == len(first), "Cache misses should still be embedded"
+
+
+@pytest.mark.core
+@pytest.mark.concurrency
+async def test_embed_async_coalesces_requests(clean_test_memory):
+    """Test that concurrent async embeddings resolve to the right vectors"""
+    memory = clean_test_memory
+    texts = ["ruby", "topaz", "opal", "garnet"]
+
+    # Compare against a plain embedding, whatever EMBED_DIMENSIONS is set to
+    dims = len(memory._embed("pearl"))
+    vecs = await asyncio.gather(*(memory._embed_async(t) for t in texts))
+    assert all(len(v) == dims for v in vecs), "Every text should be embedded"
+    for text, vec in zip(texts, vecs):
+        assert memory._cached_embedding(text) == pytest.approx(vec, abs=1e-6), (
+            "Batched results should land in the cache"
+        )
+
+    idx = await memory.add_async("User treasures an opal ring")
+    assert memory.get(idx) == "User treasures an opal ring"
+    results = await memory.query_async("opal ring", k=1)
+    assert results[0]["text"] == "User treasures an opal ring"
+
+
+@pytest.mark.core
+def test_memory_index_log_reload(clean_test_memory):
+    """Test that the appended index log survives a reload"""
+    memory = clean_test_memory
+
+    idx = memory.add("User keeps a jade pendant")
+    idxs = memory.add_many(["User likes pearls", "User dislikes rubies"])
+
+    memory._load_index()
+
+    assert set(memory.id_map) == {idx, *idxs}, "Reload should replay every entry"
+    assert memory.next_index == max(idxs) + 1, "Indices should continue after reload"
+    assert memory.get(idx) == "User keeps a jade pendant"
+
+
+@pytest.mark.core
+def test_memory_lost_index_log_reseeds_from_collection(clean_test_memory):
+    """Test that a missing index log never lets new memories reuse old ids"""
+    memory = clean_test_memory
+
+    idxs = memory.add_many(["User likes lapis", "User likes jasper"])
+    memory.map_file.unlink()
+
+    memory._load_index()
+
+    assert set(memory.id_map) == set(idxs), "Entries should be rebuilt from Chroma"
+    assert memory.next_index == max(idxs) + 1, "Indices should continue, not restart"
+    idx = memory.add("User likes agate")
+    assert idx not in idxs, "A new memory should get a fresh index"
+    assert memory.col.count() == 3, "No memory should be overwritten"
+    assert memory.get(idxs[0]) == "User likes lapis"
+
+
+@pytest.mark.core
+def test_memory_index_log_behind_collection_reseeds(clean_test_memory):
+    """Test that startup catches records written after the log's last entry"""
+    memory = clean_test_memory
+
+    idx = memory.add("User likes beryl")
+    # A crash after the Chroma write but before the index append
+    memory.col.add(
+        ids=[str(idx + 1)],
+        embeddings=[memory._embed("User likes spinel")],
+        metadatas=[{"idx": idx + 1, "ts": 0, "text": "User likes spinel"}],
+    )
+
+    memory._load_index()
+
+    assert memory.next_index == idx + 2, "Indices should skip the unlogged record"
+    assert memory.get(idx + 1) == "User likes spinel"
+
+
+@pytest.mark.core
+def test_memory_reindex(sample_test_memory):
+    """Test that reindexing keeps every memory searchable"""
+    memory = sample_test_memory
+    count = memory.col.count()
+
+    memory.reindex(page_size=2)
+
+    assert memory.col.count() == count, "Reindex should copy every memory"
+    assert memory.col.name == memory.collection_name, "Reindex should keep the name"
+    assert memory.col.metadata["hnsw:M"] == 8, "Small stores should use the small tier"
+    assert memory.get(0) is not None, "Memories should still be retrievable"
+    assert memory.query("diamonds", k=1), "Memories should still be searchable"
+
+
+@pytest.mark.core
+def test_memory_reindex_recovers_from_crash(sample_test_memory, monkeypatch):
+    """Test that a reindex interrupted mid-swap loses no memories"""
+    memory = sample_test_memory
+    count = memory.col.count()
+    collection_type = type(memory.col)
+    real_modify = collection_type.modify
+
+    def crash_on_promote(col, *args, **kwargs):
+        # Die after the live collection was renamed aside, before the copy
+        # takes over its name
+        if col.name.endswith("_reindex"):
+            raise RuntimeError("simulated crash")
+        return real_modify(col, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "modify", crash_on_promote)
+    with pytest.raises(RuntimeError):
+        memory.reindex(page_size=2)
+    monkeypatch.undo()
+
+    memory.reindex(page_size=2)
+
+    assert memory.col.count() == count, "No memory should be lost to the crash"
+    assert memory.col.name == memory.collection_name
+    assert memory.query("diamonds", k=1), "Memories should still be searchable"
+    for suffix in ("_reindex", "_old"):
+        assert memory._find_collection(memory.collection_name + suffix) is None
+
+
+@pytest.mark.core
+def test_memory_ids_match_indices(clean_test_memory):
+    """Test that new memories are stored under their index as Chroma id"""
+    memory = clean_test_memory
+
+    idx = memory.add("User collects moonstones")
+    assert memory.id_map[idx] == str(idx), "Chroma id should be the index"
+    assert memory.col.get(ids=[str(idx)])["ids"] == [str(idx)]
+
+
+@pytest.mark.core
+def test_memory_count_tracks_collection(clean_test_memory):
+    """Test that the cached count stays in step with Chroma"""
+    memory = clean_test_memory
+    assert memory.count() == 0
+
+    memory.add("User wears a silver bracelet")
+    memory.add_many(["User likes amber", "User likes onyx"])
+    assert memory.count() == memory.col.count() == 3
+
+    memory.reset()
+    assert memory.count() == 0
+
+
+@pytest.mark.core
+def test_query_cache_invalidated_by_writes(sample_test_memory):
+    """Test that cached query results never outlive a write"""
+    memory = sample_test_memory
+
+    first = memory.query("diamonds", k=5)
+    first[0].pop("distance")
+    assert "distance" in memory.query("diamonds", k=5)[0], "Cache should hand out copies"
+
+    memory.add("User just bought a diamond necklace")
+    results = memory.query("diamonds", k=5)
+    texts = [r["text"] for r in results]
+    assert "User just bought a diamond necklace" in texts, "Writes should invalidate"
+
+
+@pytest.mark.core
+@pytest.mark.concurrency
+async def test_query_many_matches_single_queries(sample_test_memory):
+    """Test that a multi-cue query returns the same hits as separate queries"""
+    memory = sample_test_memory
+    cues = ["diamonds", "programming", "coffee"]
+
+    batched = await memory.query_many(cues, k=2)
+
+    assert len(batched) == len(cues), "Should return one result list per cue"
+    for cue, results in zip(cues, batched):
+        single = memory.query(cue, k=2)
+        assert [r["text"] for r in results] == [r["text"] for r in single]
+
+
+@pytest.mark.core
+@pytest.mark.edge_cases
+async def test_query_async_skips_embedding_when_nothing_to_find(
+    sample_test_memory, monkeypatch
+):
+    """Test that empty stores and blank cues never reach the embeddings API"""
+    memory = sample_test_memory
+
+    async def fail(text):
+        raise AssertionError("embedding should not be requested")
+
+    monkeypatch.setattr(memory, "_embed_async", fail)
+
+    assert await memory.query_async("   ") == []
+    memory.reset()
+    assert await memory.query_async("diamonds") == []
+
+
+@pytest.mark.core
+def test_query_reports_iso_timestamps(clean_test_memory):
+    """Test that integer timestamps are returned as ISO strings"""
+    import datetime as dt
+
+    memory = clean_test_memory
+    memory.add("User hums while cooking")
+
+    saved_at = memory.query("cooking", k=1)[0]["saved_at"]
+    assert isinstance(saved_at, str), "saved_at should be formatted for display"
+    dt.datetime.fromisoformat(saved_at)
+
+
+@pytest.mark.core
+@pytest.mark.edge_cases
+def test_embedding_normalizes_unicode_but_not_case(clean_test_memory):
+    """Test that NFKC-equivalent text shares an embedding while case is kept"""
+    memory = clean_test_memory
+
+    memory._embed("Paris cafe")
+    cached = len(memory._embed_cache)
+    memory._embed("Ｐａｒｉｓ cafe")
+    assert len(memory._embed_cache) == cached, "NFKC forms should share an entry"
+    memory._embed("paris cafe")
+    assert len(memory._embed_cache) == cached + 1, "Case should stay significant"
+
+
+@pytest.mark.core
+@pytest.mark.concurrency
+async def test_concurrent_saves_are_coalesced(clean_test_memory):
+    """Test that concurrent add_async calls each get their own index"""
+    memory = clean_test_memory
+    texts = [f"User remembers gemstone number {i}" for i in range(5)]
+
+    idxs = await asyncio.gather(*(memory.add_async(t) for t in texts))
+
+    assert sorted(idxs) == list(range(5)), "Each save should get a distinct index"
+    for idx, text in zip(idxs, texts):
+        assert memory.get(idx) == text, "Each index should map to its own text"
+
+
+@pytest.mark.core
+async def test_background_saves_are_visible_to_queries(clean_test_memory):
+    """Test that queries wait for saves started with add_in_background"""
+    memory = clean_test_memory
+    text = "User keeps a jar of sea glass on the windowsill"
+
+    memory.add_in_background(text)
+    results = await memory.query_async("sea glass collection", k=1)
+
+    assert results and results[0]["text"] == text, "Query should see the pending save"
+    assert memory.count() == 1, "Background save should be counted once written"
+
+
+@pytest.mark.core
+async def test_failed_background_save_is_logged(clean_test_memory, monkeypatch, caplog):
+    """Test that a background save that fails is reported, not dropped silently"""
+    memory = clean_test_memory
+    monkeypatch.setattr(memory, "add_many", lambda texts, vecs: [-1] * len(texts))
+
+    memory.add_in_background("User hides a key under the doormat")
+    await memory.flush()
+    await asyncio.sleep(0)  # let the done callback run
+
+    assert "Background save failed: 'User hides a key under the doormat'" in (
+        caplog.text
+    ), "The failure should be logged with a preview of the note"
+
+
+@pytest.mark.core
+def test_chroma_sqlite_uses_wal(clean_test_memory):
+    """Test that Chroma's SQLite file is switched to write-ahead logging"""
+    import sqlite3
+
+    memory = clean_test_memory
+    con = sqlite3.connect(str(memory.db_path / "chroma.sqlite3"))
+    try:
+        mode = con.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        con.close()
+    assert mode.lower() == "wal", "Chroma's database should be in WAL mode"